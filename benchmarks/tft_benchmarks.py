@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'leagues')]
+
+import numpy as np
+import pandas as pd
+from tft_synthetic import generate_matches
+from tft_mock_server import MockRiotServer, parse_limits
+from tft_leagues_api_client import TFTAPIClient
+from tft_leagues_data_cleaning import TFTDataCleaner
+from tft_leagues_match_data import parse_matches
+
+REPORT_VERSION = 1
+PRODUCTION_LIMITS = [(500, 10.0), (30000, 600.0)]
+
+
+@contextlib.contextmanager
+def quiet(verbose: bool = False):
+    """Silences the progress prints of the code under benchmark"""
+    if verbose:
+        yield
+        return
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def timed(function: Callable, repeat: int = 1, verbose: bool = False) -> Tuple[object, List[float]]:
+    """Result of the last call and the wall time of every call"""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with quiet(verbose):
+            result = function()
+        runs.append(time.perf_counter() - start)
+    return result, runs
+
+
+def entry(name: str, params: Dict, runs: List[float], items: Optional[int] = None, unit: str = 'participants',
+          **extra) -> Dict:
+    """One report entry, seconds is the best run so noisy neighbours only ever make a run slower"""
+    best = min(runs)
+    result = {'name': name, 'params': params, 'seconds': best, 'runs': runs}
+    if items is not None:
+        result['items'] = items
+        result['throughput'] = items / best if best > 0 else None
+        result['unit'] = f'{unit}/s'
+    result.update(extra)
+    print(f"{name:<32} {json.dumps(params):<28} {best:9.3f}s"
+          + (f"  {result['throughput']:>12,.0f} {result['unit']}" if items is not None and result['throughput'] else ''))
+    return result
+
+
+def prep_sparse_features(df, vectorizer=None, min_count: int = 5):
+    """
+    Fits (unless a fitted vectorizer is given) and applies a BoardVectorizer, the
+    sparse feature stage FeaturePipeline runs without its disk cache
+    """
+    from tft_features import BoardVectorizer
+
+    if vectorizer is None:
+        vectorizer = BoardVectorizer(min_count=min_count).fit(df)
+    return vectorizer.transform(df), df['placement'], vectorizer
+
+
+def pipeline_benchmarks(sizes: List[int], repeat: int = 3, dense_limit: int = 100000, seed: int = 0,
+                        verbose: bool = False) -> List[Dict]:
+    """
+    Times the offline stages on synthetic matches of each size
+
+    Stages run in pipeline order on the previous stage's output: parse (parse_matches),
+    clean (set and current patch filters), dataframe_prep, prep_features (dense one-hot)
+    and prep_sparse_features. prep_features is skipped above dense_limit participants
+    since its one-hot frame grows with participants x unit values.
+    """
+    from tft_placement_predictor import prep_features
+
+    results = []
+    for size in sizes:
+        params = {'participants': size}
+        matches, runs = timed(lambda: list(generate_matches(math.ceil(size / 8), seed)))
+        if size % 8:
+            matches[-1]['info']['participants'] = matches[-1]['info']['participants'][:size % 8]
+        print(f"Generated {len(matches)} matches ({size} participants) in {runs[0]:.1f}s")
+
+        records, runs = timed(lambda: list(parse_matches(matches)), repeat, verbose)
+        results.append(entry('pipeline.parse', params, runs, len(records)))
+        del matches
+
+        cleaner = TFTDataCleaner(file=(records, 'benchmark'))
+
+        def clean():
+            data, _ = cleaner.set_identifier()
+            return cleaner.set_time_check(data)
+        cleaned, runs = timed(clean, repeat, verbose)
+        results.append(entry('pipeline.clean', params, runs, len(records), kept=len(cleaned)))
+
+        df, runs = timed(lambda: cleaner.dataframe_prep(cleaned), repeat, verbose)
+        results.append(entry('pipeline.dataframe_prep', params, runs, len(cleaned), columns=df.shape[1]))
+
+        if size <= dense_limit:
+            (X, _), runs = timed(lambda: prep_features(df), repeat, verbose)
+            results.append(entry('pipeline.prep_features', params, runs, len(df), features=X.shape[1]))
+            del X
+        else:
+            print(f"{'pipeline.prep_features':<32} {json.dumps(params):<28} skipped, above --dense-limit")
+
+        (X, _, _), runs = timed(lambda: prep_sparse_features(df), repeat, verbose)
+        results.append(entry('pipeline.prep_sparse_features', params, runs, len(df), features=X.shape[1], nnz=X.nnz))
+        del X, df, cleaned, records
+    return results
+
+
+def collection_benchmarks(workers: List[int], players: int = 50, count: int = 20, app_limits=PRODUCTION_LIMITS,
+                          error_rate: float = 0.0, throttle_rate: float = 0.0, latency: float = 0.0,
+                          jitter: float = 0.0, seed: int = 0, verbose: bool = False) -> List[Dict]:
+    """
+    Times a full collection against a fresh MockRiotServer for each worker count
+
+    Covers get_challenger_league, get_match_ids for players ladder players and
+    get_multi_match_data, with the client's real RateLimiter, 429 handling and retries.
+    Application or method 429s in the report mean the limiter let a request through
+    that the server's limits did not allow.
+    """
+    os.environ.setdefault('RIOT_API_KEY', 'benchmark')
+    results = []
+    for worker_count in workers:
+        params = {'workers': worker_count, 'players': players, 'count': count, 'error_rate': error_rate,
+                  'throttle_rate': throttle_rate, 'latency': latency}
+        server = MockRiotServer(app_limits=app_limits, error_rate=error_rate, throttle_rate=throttle_rate,
+                                latency=latency, jitter=jitter, seed=seed)
+        cwd = os.getcwd()
+        with server, tempfile.TemporaryDirectory(prefix='tft_benchmark_') as folder:
+            os.chdir(folder)
+            client = TFTAPIClient(pool_size=max(10, worker_count), cache_path=None, index_path=None,
+                                  base_url=server.url)
+            try:
+                puuids, league_runs = timed(lambda: client.get_challenger_league('na1')[:players], verbose=verbose)
+                match_ids, id_runs = timed(lambda: client.get_match_ids(puuids, 'na1', count), verbose=verbose)
+                matches, match_runs = timed(lambda: client.get_multi_match_data(match_ids, 'na1', worker_count),
+                                            verbose=verbose)
+            finally:
+                client.sessions.close()
+                os.chdir(cwd)
+
+        stats = dict(server.stats)
+        results.append(entry('collection.league', params, league_runs))
+        results.append(entry('collection.match_ids', params, id_runs, len(puuids), unit='players'))
+        results.append(entry('collection.match_data', params, match_runs, len(matches), unit='matches',
+                             requested=len(match_ids), server=stats))
+        print(f"{'':<32} server: {stats}")
+    return results
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    optional = {}
+    for module in ('orjson', 'msgspec', 'zstandard'):
+        try:
+            optional[module] = __import__(module).__version__
+        except ImportError:
+            optional[module] = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        **optional,
+    }
+
+
+def save_report(results: List[Dict], path: Optional[str] = None) -> str:
+    if path is None:
+        path = f"tft_data/benchmarks/benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    report = {'version': REPORT_VERSION, 'created': datetime.now().isoformat(), 'environment': environment(),
+              'results': results}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saving Benchmark Report to {path}")
+    return path
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float = 0.2) -> List[str]:
+    """
+    Benchmarks that got slower than the baseline report by more than tolerance
+
+    Entries are matched on name and params, entries missing from either report are ignored.
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(result['name'], json.dumps(result['params'], sort_keys=True)): result
+                    for result in json.load(f)['results']}
+    regressions = []
+    print(f"\n=== Compared to {baseline_path} ===")
+    for result in results:
+        previous = baseline.get((result['name'], json.dumps(result['params'], sort_keys=True)))
+        if previous is None or not previous['seconds']:
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        flag = 'REGRESSION' if ratio > 1 + tolerance else ''
+        print(f"{result['name']:<32} {json.dumps(result['params']):<28} {previous['seconds']:9.3f}s -> "
+              f"{result['seconds']:9.3f}s ({ratio:5.2f}x) {flag}")
+        if flag:
+            regressions.append(f"{result['name']} {json.dumps(result['params'])}: {ratio:.2f}x slower")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TFT Pipeline Benchmarks')
+    parser.add_argument('--suites', type=str, nargs='+', choices=['pipeline', 'collection'],
+                        default=['pipeline', 'collection'], help='Suites to run (default: both)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Participants per pipeline run, e.g. 1000 10000 100000 1000000')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per pipeline stage, the best is reported (default: 3)')
+    parser.add_argument('--dense-limit', type=int, default=100000,
+                        help='Largest size prep_features is run on (default: 100000)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8],
+                        help='Collection worker counts (default: 1 4 8)')
+    parser.add_argument('--players', type=int, default=50,
+                        help='Ladder players whose match ids are collected (default: 50)')
+    parser.add_argument('--count', type=int, default=20,
+                        help='Match ids per player (default: 20)')
+    parser.add_argument('--app-limits', type=parse_limits, default=PRODUCTION_LIMITS,
+                        help="Mock server application limits (default: 500:10,30000:600)")
+    parser.add_argument('--error-rate', type=float, default=0.02,
+                        help='Share of mock responses that are 500/503 (default: 0.02)')
+    parser.add_argument('--throttle-rate', type=float, default=0.01,
+                        help='Share of mock responses that are service 429s (default: 0.01)')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Mean mock response latency in seconds (default: 0.02)')
+    parser.add_argument('--jitter', type=float, default=0.01,
+                        help='Uniform +/- latency jitter in seconds (default: 0.01)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None,
+                        help='Report path (default: tft_data/benchmarks/benchmark_<time>.json)')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Earlier report to compare against, exits with 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown against the baseline (default: 0.2)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Keep the progress output of the benchmarked code')
+
+    args = parser.parse_args()
+    results = []
+    if 'pipeline' in args.suites:
+        print("\n=== Pipeline Benchmarks ===")
+        results += pipeline_benchmarks(args.sizes, args.repeat, args.dense_limit, args.seed, args.verbose)
+    if 'collection' in args.suites:
+        print("\n=== Collection Benchmarks (mock Riot API) ===")
+        results += collection_benchmarks(args.workers, args.players, args.count, args.app_limits, args.error_rate,
+                                         args.throttle_rate, args.latency, args.jitter, args.seed, args.verbose)
+    save_report(results, args.output)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions:\n" + '\n'.join(regressions))
+            sys.exit(1)
@@ -0,0 +1,260 @@
+import re
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from tft_synthetic import league_payload, match_payload, player_match_ids
+
+LEAGUE_PATH = re.compile(r'^/(?P<host>[a-z0-9]+)/tft/league/v1/(?P<tier>challenger|grandmaster)$')
+MATCH_IDS_PATH = re.compile(r'^/(?P<host>[a-z0-9]+)/tft/match/v1/matches/by-puuid/(?P<puuid>[^/]+)/ids$')
+MATCH_PATH = re.compile(r'^/(?P<host>[a-z0-9]+)/tft/match/v1/matches/(?P<match_id>[A-Za-z0-9]+_\d+)$')
+
+
+class LimitWindows:
+    """Server side count of requests against '20:1,100:120' style limits"""
+    def __init__(self, limits: List[Tuple[int, float]]):
+        self.limits = limits
+        self.requests = [deque() for _ in limits]
+
+
+    def retry_after(self, current_time: float) -> float:
+        """Seconds until every window has room, 0 when the request is allowed"""
+        wait = 0.0
+        for (limit, seconds), requests in zip(self.limits, self.requests):
+            while requests and current_time - requests[0] >= seconds:
+                requests.popleft()
+            if len(requests) >= limit:
+                wait = max(wait, seconds - (current_time - requests[-limit]))
+        return wait
+
+
+    def record(self, current_time: float):
+        for requests in self.requests:
+            requests.append(current_time)
+
+
+    def limit_header(self) -> str:
+        return ','.join(f'{limit}:{seconds:g}' for limit, seconds in self.limits)
+
+
+    def count_header(self) -> str:
+        return ','.join(f'{len(requests)}:{seconds:g}' for (_, seconds), requests in zip(self.limits, self.requests))
+
+
+class MockRiotServer:
+    """
+    Local stand-in for the TFT league-v1 and match-v1 endpoints.
+
+    Serves deterministic synthetic payloads under /{host}/tft/..., so a TFTAPIClient
+    created with base_url=server.url runs unchanged against it. Application and
+    per-method limits are enforced with real 429 responses and X-*-Rate-Limit headers,
+    and service 429s, 5xx errors and latency can be injected at fixed rates.
+    """
+    DefaultAppLimits = [(20, 1.0), (100, 120.0)]
+    DefaultMethodLimits = {'league': [(30, 10.0)], 'match-ids': [(600, 10.0)], 'match': [(250, 10.0)]}
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, app_limits: Optional[List[Tuple[int, float]]] = None,
+                 method_limits: Optional[Dict[str, List[Tuple[int, float]]]] = None, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, latency: float = 0.0, jitter: float = 0.0, ladder_size: int = 300,
+                 history: int = 40, match_pool: int = 100000, seed: int = 0):
+        """
+        Args:
+            port: 0 picks a free port, see url
+            app_limits: [(limit, seconds), ...] shared by every endpoint, defaults to a development key
+            method_limits: {method: [(limit, seconds), ...]} for 'league', 'match-ids' and 'match'
+            error_rate: Share of requests answered with a 500 or 503
+            throttle_rate: Share of requests answered with a service 429 without Retry-After
+            latency: Mean seconds added to each response
+            jitter: Uniform +/- seconds around latency
+            ladder_size: Players per challenger or grandmaster ladder
+            history: Matches in each player's history
+            match_pool: Distinct match ids players draw their history from
+            seed: Changes every payload and injected fault
+        """
+        self.app_limits = LimitWindows(app_limits or self.DefaultAppLimits)
+        self.method_limits = {method: LimitWindows(limits)
+                              for method, limits in (method_limits or self.DefaultMethodLimits).items()}
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.ladder_size = ladder_size
+        self.history = history
+        self.match_pool = match_pool
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+    def route(self, path: str, query: Dict[str, List[str]]) -> Tuple[Optional[str], Optional[object]]:
+        """(method, payload) for a request path, (None, None) when nothing is served there"""
+        match = LEAGUE_PATH.match(path)
+        if match:
+            return 'league', league_payload(match['host'], match['tier'], self.ladder_size)
+        match = MATCH_IDS_PATH.match(path)
+        if match:
+            start = int(query.get('start', ['0'])[0])
+            count = min(int(query.get('count', ['20'])[0]), 200)
+            return 'match-ids', player_match_ids(match['puuid'], start=start, count=count, history=self.history,
+                                                 pool=self.match_pool, seed=self.seed)
+        match = MATCH_PATH.match(path)
+        if match:
+            return 'match', match_payload(match['match_id'], self.seed)
+        return None, None
+
+
+    def admit(self, method: str) -> Tuple[int, Dict[str, str]]:
+        """Status code and rate limit headers of a request, counting it against the limits when admitted"""
+        with self._lock:
+            current_time = time.monotonic()
+            self.stats['requests'] += 1
+            method_windows = self.method_limits.get(method)
+            app_wait = self.app_limits.retry_after(current_time)
+            method_wait = method_windows.retry_after(current_time) if method_windows else 0.0
+            roll = self.random.random()
+
+            headers = {}
+            if app_wait > 0 or method_wait > 0:
+                status = 429
+                headers['Retry-After'] = str(math.ceil(max(app_wait, method_wait)))
+                headers['X-Rate-Limit-Type'] = 'application' if app_wait >= method_wait else 'method'
+                self.stats[f"429_{headers['X-Rate-Limit-Type']}"] += 1
+            else:
+                self.app_limits.record(current_time)
+                if method_windows:
+                    method_windows.record(current_time)
+                if roll < self.throttle_rate:
+                    status = 429
+                    headers['X-Rate-Limit-Type'] = 'service'
+                    self.stats['429_service'] += 1
+                elif roll < self.throttle_rate + self.error_rate:
+                    status = self.random.choice((500, 503))
+                    self.stats[f'{status}'] += 1
+                else:
+                    status = 200
+                    self.stats[f'200_{method}'] += 1
+
+            headers['X-App-Rate-Limit'] = self.app_limits.limit_header()
+            headers['X-App-Rate-Limit-Count'] = self.app_limits.count_header()
+            if method_windows:
+                headers['X-Method-Rate-Limit'] = method_windows.limit_header()
+                headers['X-Method-Rate-Limit-Count'] = method_windows.count_header()
+            return status, headers
+
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                method, payload = server.route(parts.path, parse_qs(parts.query))
+                if method is None:
+                    with server._lock:
+                        server.stats['404'] += 1
+                    self.respond(404, {}, {'status': {'message': 'Data not found', 'status_code': 404}})
+                    return
+                status, headers = server.admit(method)
+                pause = server.delay()
+                if pause:
+                    time.sleep(pause)
+                if status != 200:
+                    payload = {'status': {'message': 'Synthetic error', 'status_code': status}}
+                self.respond(status, headers, payload)
+
+            def respond(self, status: int, headers: Dict[str, str], payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json;charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def parse_limits(value: str) -> List[Tuple[int, float]]:
+    """'20:1,100:120' to [(20, 1.0), (100, 120.0)]"""
+    limits = []
+    for pair in value.split(','):
+        limit, seconds = pair.strip().split(':')
+        limits.append((int(limit), float(seconds)))
+    return limits
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mock Riot TFT API server')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--app-limits', type=parse_limits, default=MockRiotServer.DefaultAppLimits,
+                        help="Application limits as 'limit:seconds,...' (default: 20:1,100:120)")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of requests answered with 500/503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Share of requests answered with a service 429')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Mean seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Uniform +/- seconds around latency')
+    parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    server = MockRiotServer(port=args.port, app_limits=args.app_limits, error_rate=args.error_rate,
+                            throttle_rate=args.throttle_rate, latency=args.latency, jitter=args.jitter,
+                            seed=args.seed)
+    print(f"Serving mock Riot API on {server.url}, set RIOT_API_BASE_URL={server.url} to use it")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"Served: {dict(server.stats)}")
@@ -0,0 +1,118 @@
+import zlib
+import random
+from typing import Dict, Iterator, List, Optional
+
+CHAMPIONS = [f'TFT16_Champion{i:02d}' for i in range(60)]
+ITEMS = [f'TFT_Item_Synthetic{i:02d}' for i in range(45)]
+TRAITS = [f'TFT16_Trait{i:02d}' for i in range(28)]
+AUGMENTS = [f'TFT16_Augment{i:02d}' for i in range(80)]
+STAR_LEVELS = (1, 1, 1, 1, 1, 2, 2, 2, 2, 3)
+ITEM_COUNTS = (0, 0, 0, 0, 1, 1, 2, 3, 3, 3)
+GAME_VERSION = 'Linux Version 16.1.700.1234 (Dec 16 2025/12:00:00) [PUBLIC] <Releases/16.1>'
+FIRST_GAME = 1766000000000  # 2025-12-17, after the latest registered patch release
+
+
+def _rng(key: str, seed: int) -> random.Random:
+    """Random stream that depends only on the key and seed, so payloads are identical across runs and processes"""
+    return random.Random(zlib.crc32(key.encode()) ^ seed)
+
+
+def ladder_puuids(platform: str, tier: str, size: int) -> List[str]:
+    """PUUIDs of a synthetic challenger or grandmaster ladder"""
+    return [f'{platform.lower()}-{tier}-{i:05d}' for i in range(size)]
+
+
+def league_payload(platform: str, tier: str, size: int) -> Dict:
+    """league-v1 response for a synthetic ladder"""
+    rng = _rng(f'{platform}:{tier}', 0)
+    entries = [
+        {'puuid': puuid, 'leaguePoints': rng.randint(0, 2500), 'rank': 'I',
+         'wins': rng.randint(20, 200), 'losses': rng.randint(20, 200)}
+        for puuid in ladder_puuids(platform, tier, size)
+    ]
+    return {'tier': tier.upper(), 'queue': 'RANKED_TFT', 'name': f'Synthetic {tier}', 'entries': entries}
+
+
+def player_match_ids(puuid: str, prefix: str = 'NA1', start: int = 0, count: int = 20,
+                     history: int = 40, pool: int = 100000, seed: int = 0) -> List[str]:
+    """
+    Page of a player's synthetic match history, newest first
+
+    Every player has history matches drawn from a shared pool of match ids, so
+    players of the same ladder share matches like a real lobby would.
+    """
+    rng = _rng(puuid, seed)
+    matches = [f'{prefix}_{5400000000 + rng.randrange(pool)}' for _ in range(history)]
+    return matches[start:start + count]
+
+
+def match_payload(match_id: str, seed: int = 0, puuids: Optional[List[str]] = None) -> Dict:
+    """
+    match-v1 response with the fields parse_data reads plus the usual extras
+
+    Args:
+        match_id: Decides every value of the payload together with seed
+        puuids: Lobby members, defaults to synthetic players
+    """
+    rng = _rng(match_id, seed)
+    number = int(match_id.rsplit('_', 1)[-1])
+    if puuids is None:
+        puuids = [f'player-{rng.randrange(5000):05d}' for _ in range(8)]
+    placements = list(range(1, len(puuids) + 1))
+    rng.shuffle(placements)
+
+    participants = []
+    for puuid, placement in zip(puuids, placements):
+        level = rng.randint(7, 10)
+        units = [
+            {'character_id': character, 'tier': STAR_LEVELS[int(rng.random() * 10)], 'rarity': int(rng.random() * 7),
+             'itemNames': rng.sample(ITEMS, ITEM_COUNTS[int(rng.random() * 10)])}
+            for character in rng.sample(CHAMPIONS, rng.randint(level - 2, level))
+        ]
+        traits = []
+        for name in rng.sample(TRAITS, rng.randint(5, 10)):
+            num_units = 1 + int(rng.random() * 7)
+            tier = min(num_units // 2, 4)
+            traits.append({'name': name, 'num_units': num_units, 'style': tier, 'tier_current': tier,
+                           'tier_total': 4})
+        participants.append({
+            'puuid': puuid,
+            'riotIdGameName': f'Synthetic{puuid[-5:]}',
+            'riotIdTagline': 'BENCH',
+            'placement': placement,
+            'level': level,
+            'last_round': rng.randint(20, 40) if placement > 1 else 42,
+            'players_eliminated': rng.randint(0, 3),
+            'gold_left': rng.randint(0, 60),
+            'time_eliminated': round(rng.uniform(1200, 2400), 3),
+            'total_damage_to_players': rng.randint(0, 200),
+            'win': placement <= 4,
+            'units': units,
+            'traits': traits,
+            'augments': rng.sample(AUGMENTS, 3),
+            'companion': {'content_ID': f'companion-{rng.randrange(100)}', 'item_ID': rng.randrange(10000),
+                          'skin_ID': rng.randrange(50), 'species': 'PetSynthetic'},
+        })
+
+    return {
+        'metadata': {'data_version': '6', 'match_id': match_id, 'participants': list(puuids)},
+        'info': {
+            'endOfGameResult': 'GameComplete',
+            'gameCreation': FIRST_GAME + (number % 10 ** 7) * 1000,
+            'game_datetime': FIRST_GAME + (number % 10 ** 7) * 1000,
+            'game_length': round(rng.uniform(1500, 2400), 3),
+            'game_version': GAME_VERSION,
+            'mapId': 22,
+            'queue_id': 1100,
+            'tft_game_type': 'standard',
+            'tft_set_core_name': 'TFTSet16',
+            'tft_set_number': 16,
+            'participants': participants,
+        },
+    }
+
+
+def generate_matches(n_matches: int, seed: int = 0, prefix: str = 'NA1') -> Iterator[Dict]:
+    """Yields n_matches distinct synthetic matches, 8 participants each"""
+    for i in range(n_matches):
+        yield match_payload(f'{prefix}_{5400000000 + i}', seed)
@@ -1,9 +1,20 @@
 import os
+import sys
 from dotenv import load_dotenv
 import requests
 from typing import List, Dict, Optional
-from datetime import datetime
-import json
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_codec import dumps
+from tft_http import SessionPool, request_json
+from tft_match_cache import MatchCache
+from tft_match_index import MatchIndex, FETCHED
+from tft_metrics import METRICS, add_profiling_arguments, profiled
+
 
 class TFTAPIClient:
     load_dotenv()
@@ -16,17 +27,25 @@ class TFTAPIClient:
         'sea': ['oc1', 'ph2', 'sg2', 'th2', 'tw2', 'vn2']
     }
 
-    def __init__(self):
+    def __init__(self, max_retries: int = 5, timeout: float = 10.0,
+                 cache_path: Optional[str] = 'tft_data/match_cache.sqlite',
+                 index_path: Optional[str] = 'tft_data/match_index.sqlite'):
         load_dotenv()
         self.api_key = os.getenv('RIOT_API_KEY')
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.sessions = SessionPool()
+        self.match_cache = MatchCache(cache_path) if cache_path else None
+        self.match_index = MatchIndex(index_path) if index_path else None
 
 
-    def make_request(self, url: str) -> Dict:
-        headers = {
-            "X-Riot-Token": self.api_key
-        }
-        response = requests.get(url, headers=headers)
-        return response.json()
+    def make_request(self, url: str, method: Optional[str] = None) -> Dict:
+        """
+        Args:
+            url: Full request url
+            method: API method name the request metrics are labelled with (e.g. 'match')
+        """
+        return request_json(self.sessions, url, self.api_key, self.max_retries, self.timeout, method)
 
     def get_region_routing(self, platform: str) -> str:
         for region, platforms in self.Regions.items():
@@ -37,27 +56,45 @@ class TFTAPIClient:
     def get_puuid(self, gamename: str, tagline: str, platform: str) -> str:
         region = self.get_region_routing(platform)
         url = f"https://{region}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{gamename}/{tagline}"
-        summoner = self.make_request(url)
+        summoner = self.make_request(url, 'account')
         puuid = next(iter(summoner.values()))
         return str(puuid)
 
-    def get_match_ids(self, puuid: str, platform: str, count: int = 1, start: int = 0):
+    def get_match_ids(self, puuid: str, platform: str, count: int = 1, start: int = 0, start_time: Optional[int] = None):
         region = self.get_region_routing(platform)
         url = f"https://{region}.api.riotgames.com/tft/match/v1/matches/by-puuid/{puuid}/ids?start={start}&count={count}"
-        match_id = self.make_request(url)
+        if start_time is not None:
+            url += f"&startTime={start_time}"
+        match_id = self.make_request(url, 'match-ids')
         return match_id
 
+    def fetch_match(self, match_id: str, region: str) -> Dict:
+        if self.match_cache is not None:
+            cached = self.match_cache.get(match_id)
+            if cached is not None:
+                METRICS.inc('tft_matches_total', source='cache')
+                return cached
+        # matches the index marks as fetched are requested again once evicted from the cache
+        url = f"https://{region}.api.riotgames.com/tft/match/v1/matches/{match_id}"
+        match_data = self.make_request(url, 'match')
+        METRICS.inc('tft_matches_total', source='api')
+        if self.match_cache is not None:
+            self.match_cache.put(match_id, match_data)
+        if self.match_index is not None:
+            self.match_index.mark([match_id], FETCHED, source='individuals')
+        return match_data
+
     def get_single_match_data(self, match_id: str, platform: str):
         region = self.get_region_routing(platform)
         filepath = f'tft_data/raw_matches/{match_id}.json'
         data = []
-        url = f"https://{region}.api.riotgames.com/tft/match/v1/matches/{match_id}"
-        match_data = self.make_request(url)
+        match_data = self.fetch_match(match_id, region)
         print("Fetching match data...")
-        data.append(match_data)
+        if match_data is not None:
+            data.append(match_data)
         print(f"Saving Match Data to {filepath}")
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(dumps(data, indent=True))
         return data
 
     def get_multi_match_data(self, match_id: List, platform: str):
@@ -65,26 +102,32 @@ class TFTAPIClient:
         filepath = f'tft_data/raw_matches/{match_id[0]}_{match_id[-1]}_{len(match_id)}.json'
         data = []
         for match in match_id:
-            url = f"https://{region}.api.riotgames.com/tft/match/v1/matches/{match}"
-            match_data = self.make_request(url)
+            try:
+                match_data = self.fetch_match(match, region)
+            except requests.exceptions.RequestException as e:
+                # left unfetched in the match index, so the next run requests it again
+                print(f"Failed to fetch match {match}: {e}")
+                continue
             print(f'Fetched match data for {match}')
             data.append(match_data)
         print(f"Saving Match Data to {filepath}")
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(dumps(data, indent=True))
         return data
 
 
 
 if __name__ == "__main__":
-    client = TFTAPIClient()
-
-    print("Fetching summoner data...")
-    puuid = client.get_puuid('Flancy', '1113', 'na1')
-    print(puuid)
-    print("Fatching match ids...")
-    match_id = client.get_match_ids(puuid, 'na1', 10)
-    print(match_id)
-    # client.get_single_match_data(match_id, 'na1')
-    client.get_multi_match_data(match_id, 'na1')
+    args = add_profiling_arguments(argparse.ArgumentParser(description='TFT API Client')).parse_args()
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        client = TFTAPIClient()
+
+        print("Fetching summoner data...")
+        puuid = client.get_puuid('Flancy', '1113', 'na1')
+        print(puuid)
+        print("Fatching match ids...")
+        match_id = client.get_match_ids(puuid, 'na1', 10)
+        print(match_id)
+        # client.get_single_match_data(match_id, 'na1')
+        client.get_multi_match_data(match_id, 'na1')
 
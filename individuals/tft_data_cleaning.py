@@ -1,53 +1,62 @@
-import json
+import os
 import sys
 import argparse
-from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_codec import dumps
 from tft_match_data import data_collector_main
+from tft_match_filter import MatchFilter, drop_empty_slots
+from tft_metrics import METRICS, add_profiling_arguments, profiled
+from tft_patches import PatchRegistry
 import pandas as pd
 
+
 class TFTDataCleaner:
 
-    def __init__(self, name: str = '100T Dishsoap#NA2', platform: str = 'na1', count: int = 5):
+    def __init__(self, name: str = '100T Dishsoap#NA2', platform: str = 'na1', count: int = 5,
+                 start_time: Optional[int] = None, names: Optional[List[str]] = None):
         # self.file = file
-        self.file = data_collector_main(name=name, platform=platform, count=count)
+        self.patches = PatchRegistry()
+        self.dataframe = None
+        self.file = data_collector_main(name=name, platform=platform, count=count, start_time=start_time,
+                                        names=names)
         
 
-    def set_identifier(self, set_number: int = 16):
-        data = []
-        for match in self.file[0]:
-            if match['tft_set_number'] != set_number:
-                del match
-            else:
-                data.append(match)
-        set_corrected = self.file
-        filename = self.file[1]
-        
-        return data, filename
-
-    def set_time_check(self, match_data: List):
-        data = []
-        current_set_release = datetime(2025, 12, 9, 8, 15, 0)
-        for match in match_data:
-            match_datetime = datetime.fromisoformat(match['game_datetime'])
-            if match_datetime < current_set_release:
-                del match
-            else:
-                data.append(match)
-        return data
+    def filter_matches(self, match_filter: MatchFilter):
+        """
+        Applies every filter to the collected records as one vectorized mask
 
-    def top_4(self, match_data: List):
-        data = []
-        for match in match_data:
-            placement = match['placement']
-            if placement > 4:
-                del match
-            else:
-                data.append(match)
+        The wide dataframe is prepared once with the columns the filter reads and masked
+        by MatchFilter.apply_frame. The passing rows are kept in self.dataframe, so the
+        output is saved without preparing the records again.
+        """
+        records, filename = self.file
+        self.dataframe = None
+        if not records or match_filter.columns is None:
+            # custom predicates without a frame form are checked per record
+            return match_filter.apply(records), filename
+        dataframe = match_filter.apply_frame(self.dataframe_prep(records, match_filter.columns))
+        extra = [col for col in match_filter.columns if col not in ('riotIdGameName', 'match_id', 'placement')]
+        self.dataframe = drop_empty_slots(dataframe.drop(columns=extra)).reset_index(drop=True)
+        return [records[i] for i in dataframe.index], filename
+
+    def set_identifier(self, set_number: Optional[int] = None):
+        if set_number is None:
+            set_number = self.patches.latest().set_number
+        return self.filter_matches(MatchFilter(set_number=set_number))
 
-        return data
+    def set_time_check(self, match_data: List, patch: Optional[str] = None):
+        current_patch = self.patches.get(patch) if patch else self.patches.latest()
+        return MatchFilter(released_after=current_patch.released).apply(match_data)
+
+    def top_4(self, match_data: List):
+        return MatchFilter(placement_range=(1, 4)).apply(match_data)
 
-    def dataframe_prep(self, match_data):
+    def dataframe_prep(self, match_data, columns: Optional[Dict[str, Callable[[Dict], object]]] = None):
 
         rows = []
         for record in match_data:
@@ -71,33 +80,54 @@ class TFTDataCleaner:
                 row[f'trait_{i}_num_units'] = trait['num_units']
                 row[f'trait_{i}_tier'] = trait['tier']
             
+            if columns is not None:
+                for col, getter in columns.items():
+                    row[col] = getter(record)
             rows.append(row)
 
         df = pd.DataFrame(rows)
         return df
         
 
-def main(name: str, platform: str, count: int):
-    cleaner = TFTDataCleaner(name=name, platform=platform, count=count)
-    set_id = cleaner.set_identifier()
-    set_time = cleaner.set_time_check(set_id[0])
-    top_4_matches = cleaner.top_4(set_time)
+def main(name: str, platform: str, count: int, patch: Optional[str] = None, names: Optional[List[str]] = None):
+    patches = PatchRegistry()
+    current_patch = patches.get(patch) if patch else patches.latest()
+    cleaner = TFTDataCleaner(name=name, platform=platform, count=count,
+                             start_time=int(current_patch.released.timestamp()), names=names)
+    match_filter = MatchFilter(set_number=current_patch.set_number, released_after=current_patch.released,
+                               placement_range=(1, 4))
+    with METRICS.stage('filter') as stage:
+        set_id = cleaner.filter_matches(match_filter)
+        stage.records = len(cleaner.file[0])
+    top_4_matches = set_id[0]
+    if not top_4_matches:
+        print("No records left to clean, nothing saved")
+        return
     cleaned_file_json = 'tft_data/cleaned_matches/' + set_id[1] + '.json'
     print(f"Saving Cleaned Match Data to {cleaned_file_json}")
-    with open(cleaned_file_json, 'w') as f:
-        json.dump(top_4_matches, f, indent=2)
-    dataframe = cleaner.dataframe_prep(top_4_matches)
+    with open(cleaned_file_json, 'w', encoding='utf-8') as f:
+        f.write(dumps(top_4_matches, indent=True))
+    # prepared and masked by filter_matches
+    dataframe = cleaner.dataframe
     csv = 'tft_data/cleaned_csv/' + set_id[1] + '.csv'
-    dataframe.to_csv(csv)
+    with METRICS.stage('save') as stage:
+        dataframe.to_csv(csv)
+        stage.records = len(dataframe)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='TFT Data Cleaner')
     parser.add_argument('--name', type=str, default='100T Dishsoap#NA2', 
                         help='Player name (default: 100T Dishsoap#NA2)')
+    parser.add_argument('--names', type=str, nargs='+', default=None,
+                        help='Several player names to collect in one pass, replaces --name')
     parser.add_argument('--platform', type=str, default='na1',
                         help='Platform (default: na1)')
     parser.add_argument('--count', type=int, default=5,
                         help='(default: count 5)')       
+    parser.add_argument('--patch', type=str, default=None,
+                        help='Patch from tft_patches.json to keep, e.g. 16.1b (default: latest)')
+    add_profiling_arguments(parser)
 
     args = parser.parse_args()
-    main(name=args.name, platform=args.platform, count=args.count)
\ No newline at end of file
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        main(name=args.name, platform=args.platform, count=args.count, patch=args.patch, names=args.names)
\ No newline at end of file
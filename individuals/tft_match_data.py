@@ -1,8 +1,17 @@
-import json
+import os
+import sys
+import argparse
 from datetime import datetime
-from typing import List, Dict, Optional
-from dotenv import load_dotenv
+from typing import List, Dict, Optional, Iterable, Union
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
 from tft_api_client import TFTAPIClient
+from tft_codec import dumps
+from tft_match_index import SEEN, PARSED
+from tft_metrics import METRICS, add_profiling_arguments, profiled
 
 class TFTDataCollector:
 
@@ -17,8 +26,8 @@ class TFTDataCollector:
         # print(summoner)
         return summoner
 
-    def collect_match_ids(self, puuid: str, platform: str, count: int = 5) -> List[str]:
-        match_ids = self.client.get_match_ids(puuid, platform, count)
+    def collect_match_ids(self, puuid: str, platform: str, count: int = 5, start_time: Optional[int] = None) -> List[str]:
+        match_ids = self.client.get_match_ids(puuid, platform, count, start_time=start_time)
         # print(match_ids)
         return match_ids
 
@@ -30,78 +39,138 @@ class TFTDataCollector:
 
         return match_data
 
-    def parse_data(self, match_data, target_puuid: str):
+    def collect_players_match_ids(self, puuids: List[str], platform: str, count: int = 5,
+                                  start_time: Optional[int] = None) -> List[str]:
+        """Collects every tracked player's match IDs, a lobby shared by several of them is listed once"""
+        match_ids = []
+        for puuid in puuids:
+            match_ids.extend(self.collect_match_ids(puuid, platform, count, start_time))
+        return list(dict.fromkeys(match_ids))
+
+    def parse_data(self, match_data, target_puuids: Union[str, Iterable[str]]):
+        """
+        Parses the boards of the tracked players out of each match
+
+        Tracked players are looked up through the match metadata participants list, so
+        every match is read once no matter how many tracked players shared its lobby.
+
+        Args:
+            match_data: List of match data dictionaries
+            target_puuids: PUUID of the tracked player, or several PUUIDs
+
+        Returns:
+            data: One record per tracked player per match
+        """
+        tracked = {target_puuids} if isinstance(target_puuids, str) else set(target_puuids)
         data = []
         for match in match_data:
             info = match['info']
-
-            player_data = None
-            for participant in info['participants']:
-                if participant['puuid'] == target_puuid:
-                    player_data = participant
-                    break
-            
-            if not player_data:
-                raise ValueError(f"Player with PUUID {target_puuid} not found in match")
-
-            units = []
-            for unit in player_data.get('units', []):
-                units.append({
-                    'character_id': unit['character_id'],
-                    'star_level': unit['tier'],
-                    'items': unit.get('itemNames', [])
-                })
-
-            traits = []
-            for trait in player_data.get('traits', []):
-                if trait['tier_current'] > 0:
-                    traits.append({
-                        'name': trait['name'],
-                        'num_units': trait['num_units'],
-                        'tier': trait['tier_current']
-                    })
-            match_data_each = {
-            'match_id': match_data[0]['metadata']['match_id'],
-            'riotIdGameName': player_data['riotIdGameName'],
-            'game_datetime': datetime.fromtimestamp(info['game_datetime'] / 1000).isoformat(),
-            'game_length': info['game_length'],
-            'game_version': info['game_version'],
-            'tft_set_number': info['tft_set_number'],
-            'queue_id': info['queue_id'],
-            'placement': player_data['placement'],
-            'level': player_data['level'],
-            'last_round': player_data['last_round'],
-            'players_eliminated': player_data['players_eliminated'],
-            'gold_left': player_data['gold_left'],
-            'time_eliminated': player_data['time_eliminated'],
-            'total_damage_to_players': player_data['total_damage_to_players'],
-            'units': units,
-            'traits': traits,
-            'companion': player_data.get('companion', {})
-            }
-            data.append(match_data_each)
+            metadata = match['metadata']
+            participants = info['participants']
+
+            found = False
+            for position, puuid in enumerate(metadata['participants']):
+                if puuid not in tracked:
+                    continue
+                player_data = participants[position]
+                if player_data['puuid'] != puuid:
+                    # metadata and info order disagree, fall back to a scan
+                    player_data = next(participant for participant in participants if participant['puuid'] == puuid)
+                data.append(self.parse_player(metadata, info, player_data))
+                found = True
+
+            if not found:
+                raise ValueError(f"No tracked player found in match {metadata['match_id']}")
         return data
 
-def data_collector_main(name: str = '100T Dishsoap#NA2', platform: str = 'na1', count: int = 5):
-
+    def parse_player(self, metadata: Dict, info: Dict, player_data: Dict) -> Dict:
+        units = []
+        for unit in player_data.get('units', []):
+            units.append({
+                'character_id': unit['character_id'],
+                'star_level': unit['tier'],
+                'items': unit.get('itemNames', [])
+            })
+
+        traits = []
+        for trait in player_data.get('traits', []):
+            if trait['tier_current'] > 0:
+                traits.append({
+                    'name': trait['name'],
+                    'num_units': trait['num_units'],
+                    'tier': trait['tier_current']
+                })
+        return {
+        'match_id': metadata['match_id'],
+        'puuid': player_data['puuid'],
+        'riotIdGameName': player_data['riotIdGameName'],
+        'game_datetime': datetime.fromtimestamp(info['game_datetime'] / 1000).isoformat(),
+        'game_timestamp': info['game_datetime'],
+        'game_length': info['game_length'],
+        'game_version': info['game_version'],
+        'tft_set_number': info['tft_set_number'],
+        'queue_id': info['queue_id'],
+        'placement': player_data['placement'],
+        'level': player_data['level'],
+        'last_round': player_data['last_round'],
+        'players_eliminated': player_data['players_eliminated'],
+        'gold_left': player_data['gold_left'],
+        'time_eliminated': player_data['time_eliminated'],
+        'total_damage_to_players': player_data['total_damage_to_players'],
+        'units': units,
+        'traits': traits,
+        'companion': player_data.get('companion', {})
+        }
+
+def data_collector_main(name: str = '100T Dishsoap#NA2', platform: str = 'na1', count: int = 5,
+                        start_time: Optional[int] = None, names: Optional[List[str]] = None):
+    """
+    Main collector
+
+    Args:
+        name: Riot ID of the player to collect
+        platform: Platform identifier (e.g., 'na1')
+        count: Matches per player
+        start_time: Epoch seconds, matches played before it are never fetched
+        names: Riot IDs of several tracked players to collect in one pass instead of name,
+            a match shared by several of them is fetched and parsed once
+    """
     collector = TFTDataCollector()
 
-    player = name.replace('#','')
-
-    puuid = collector.get_puuid_by_summoner(name, platform)
-    match_ids = collector.collect_match_ids(puuid, platform, count)
-    match_data = collector.collect_match_data(match_ids, platform)
-    parsed_data = collector.parse_data(match_data, puuid)
+    names = names or [name]
+    player = names[0].replace('#','') if len(names) == 1 else f'{len(names)}_players'
+
+    puuids = [collector.get_puuid_by_summoner(riot_id, platform) for riot_id in names]
+    with METRICS.stage('collect_match_ids') as stage:
+        match_ids = collector.collect_players_match_ids(puuids, platform, count, start_time)
+        stage.records = len(match_ids)
+    if not match_ids:
+        # start_time drops every game played before the patch, so a player can have none yet
+        print("No matches found")
+        return [], f'{player}_no_matches'
+    match_index = collector.client.match_index
+    if match_index is not None:
+        match_index.mark(match_ids, SEEN, source='individuals')
+    with METRICS.stage('collect_match_data') as stage:
+        match_data = collector.collect_match_data(match_ids, platform)
+        stage.records = len(match_data)
+    with METRICS.stage('parse') as stage:
+        parsed_data = collector.parse_data(match_data, puuids)
+        stage.records = len(parsed_data)
+    if match_index is not None:
+        match_index.mark([match['metadata']['match_id'] for match in match_data], PARSED, source='individuals')
 
     # parsed_file = f"tft_data/parsed_matches/{player}_{match_ids[0]}_{len(match_ids)}.json"
     filename = f'{player}_{match_ids[0]}_{len(match_ids)}'
     parsed_file = 'tft_data/parsed_matches/' + filename + '.json'
     print(f"Saving Parsed Match Data to {parsed_file}")
-    with open(parsed_file, 'w') as f:
-        json.dump(parsed_data, f, indent=2)
+    with open(parsed_file, 'w', encoding='utf-8') as f:
+        f.write(dumps(parsed_data, indent=True))
 
     return parsed_data, filename
 
 
 if __name__ == '__main__':
-    data_collector_main()
\ No newline at end of file
+    args = add_profiling_arguments(argparse.ArgumentParser(description='TFT Data Collector')).parse_args()
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        data_collector_main()
\ No newline at end of file
@@ -1,60 +1,154 @@
 import os
+import sys
 from dotenv import load_dotenv
-import requests
-from typing import List, Dict, Optional
-from datetime import datetime
-import json
+from typing import List, Dict, Iterator, Optional, Tuple
 import time
+import argparse
+import itertools
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_match_cache import MatchCache
+from tft_http import SessionPool, request_json
+from tft_match_index import MatchIndex, FETCHED
+from tft_leagues_match_store import MatchWriter, read_matches
+from tft_metrics import METRICS, add_profiling_arguments, profiled
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+class RateWindow:
+    """Sliding log of request timestamps for a single Riot limit, e.g. 100 requests per 120s"""
+    def __init__(self, limit: int, seconds: float):
+        self.limit = limit
+        self.seconds = seconds
+        self.requests = deque()
+
+
+    def __repr__(self):
+        return f"{self.limit}:{self.seconds:g}s"
+
+
+    def wait_time(self, current_time: float) -> float:
+        """Seconds until this window has room for another request"""
+        while self.requests and current_time - self.requests[0] >= self.seconds:
+            self.requests.popleft()
+        if len(self.requests) < self.limit:
+            return 0.0
+        return self.seconds - (current_time - self.requests[-self.limit])
+
+
+    def record(self, current_time: float, count: int = 1):
+        for _ in range(count):
+            self.requests.append(current_time)
+
 
 class RateLimiter:
-    """Limits the number of requests to TFT API to avoid call limits"""
-    def __init__(self, max_requests_per_second: int = 20, max_requests_per_two_minutes: int = 100):
+    """
+    Limits the number of requests to TFT API to avoid call limits
+
+    Tracks any number of application windows plus separate windows per API method,
+    and is safe to share between threads. Limits and counts are corrected from the
+    X-App-Rate-Limit / X-Method-Rate-Limit response headers, so usage by other
+    processes on the same key is accounted for as well.
+    """
+    def __init__(self, max_requests_per_second: int = 20, max_requests_per_two_minutes: int = 100,
+                 buffer: float = 1.0, method_limits: Optional[Dict[str, List[Tuple[int, float]]]] = None):
         """
         Initialize rate limiter 
+
+        Args:
+            max_requests_per_second: Application limit for the 1s window
+            max_requests_per_two_minutes: Application limit for the 2m window
+            buffer: Multiplier applied to limits learned from response headers
+            method_limits: Known per-method limits as {method: [(limit, seconds), ...]}
         """
-        self.max_per_second = max_requests_per_second
-        self.max_per_two_minutes = max_requests_per_two_minutes
-        
-        self.requests_last_second = deque()
-        self.requests_last_two_minutes = deque()
-    
+        self.buffer = buffer
+        self.app_windows = [RateWindow(max_requests_per_second, 1.0),
+                            RateWindow(max_requests_per_two_minutes, 120.0)]
+        self.method_windows = {
+            method: [RateWindow(self._buffered(limit), seconds) for limit, seconds in limits]
+            for method, limits in (method_limits or {}).items()
+        }
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+
+    def _buffered(self, limit: int) -> int:
+        return max(1, int(limit * self.buffer))
+
 
-    def wait_if_needed(self):
+    def wait_if_needed(self, method: Optional[str] = None):
         """Creates a wait period whenever the max api rate is reached to avoid data errors"""
-        current_time = time.time()
-        
-        self._clean_old_requests(current_time)
-
-        if len(self.requests_last_second) >= self.max_per_second:
-            oldest_request = self.requests_last_second[0]
-            wait_time = 1.0 - (current_time - oldest_request)
-            if wait_time > 0:
-                print(f"Rate limit approaching (1s window). Waiting {wait_time:.2f}s...")
-                time.sleep(wait_time)
-                current_time = time.time()
-                self._clean_old_requests(current_time)
-        
-        if len(self.requests_last_two_minutes) >= self.max_per_two_minutes:
-            oldest_request = self.requests_last_two_minutes[0]
-            wait_time = 120.0 - (current_time - oldest_request)
-            if wait_time > 0:
-                print(f"Rate limit approaching (2m window). Waiting {wait_time:.2f}s...")
-                time.sleep(wait_time)
+        while True:
+            with self._lock:
                 current_time = time.time()
-                self._clean_old_requests(current_time)
-        
-        self.requests_last_second.append(current_time)
-        self.requests_last_two_minutes.append(current_time)
-
-    
-    def _clean_old_requests(self, current_time: float):
-        """Removes requests that fall outside of tracking window"""
-        while self.requests_last_second and current_time - self.requests_last_second[0] > 1.0:
-            self.requests_last_second.popleft()
-        
-        while self.requests_last_two_minutes and current_time - self.requests_last_two_minutes[0] > 120.0:
-            self.requests_last_two_minutes.popleft()
+                windows = self.app_windows + self.method_windows.get(method, [])
+                wait_time = self.blocked_until - current_time
+                limiting = 'retry-after'
+                for window in windows:
+                    window_wait = window.wait_time(current_time)
+                    if window_wait > wait_time:
+                        wait_time, limiting = window_wait, repr(window)
+                if wait_time <= 0:
+                    for window in windows:
+                        window.record(current_time)
+                    return
+            print(f"Rate limit approaching ({limiting} window). Waiting {wait_time:.2f}s...")
+            METRICS.inc('tft_rate_limit_waits_total', method=method or 'none', window=limiting)
+            METRICS.inc('tft_rate_limit_sleep_seconds_total', wait_time, method=method or 'none', window=limiting)
+            time.sleep(wait_time)
+
+
+    def block_for(self, seconds: float):
+        """Pauses every caller of the limiter, used when the API answers with 429"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
+
+    def update_from_headers(self, headers, method: Optional[str] = None):
+        """Adjusts limits and counts to the values reported in the API response headers"""
+        with self._lock:
+            current_time = time.time()
+            app = self._sync_windows(self.app_windows, headers.get('X-App-Rate-Limit'),
+                                     headers.get('X-App-Rate-Limit-Count'), current_time)
+            if app is not None:
+                self.app_windows = app
+            if method is not None:
+                windows = self._sync_windows(self.method_windows.get(method, []), headers.get('X-Method-Rate-Limit'),
+                                             headers.get('X-Method-Rate-Limit-Count'), current_time)
+                if windows is not None:
+                    self.method_windows[method] = windows
+
+
+    def _sync_windows(self, windows: List[RateWindow], limit_header: Optional[str],
+                      count_header: Optional[str], current_time: float) -> Optional[List[RateWindow]]:
+        """Rebuilds windows from a '20:1,100:120' style header, keeping tracked requests"""
+        if not limit_header:
+            return None
+        existing = {window.seconds: window for window in windows}
+        counts = self._parse_header(count_header) if count_header else {}
+        synced = []
+        for seconds, limit in self._parse_header(limit_header).items():
+            window = existing.get(seconds) or RateWindow(0, seconds)
+            window.limit = self._buffered(limit)
+            window.wait_time(current_time)
+            missing = counts.get(seconds, 0) - len(window.requests)
+            if missing > 0:
+                window.record(current_time, missing)
+            synced.append(window)
+        return synced
+
+
+    @staticmethod
+    def _parse_header(value: str) -> Dict[float, int]:
+        parsed = {}
+        for pair in value.split(','):
+            amount, seconds = pair.strip().split(':')
+            parsed[float(seconds)] = int(amount)
+        return parsed
 
 
 class TFTAPIClient:
@@ -65,74 +159,96 @@ class TFTAPIClient:
         'europe': ['eun1', 'euw1', 'tr1', 'ru'],
         'sea': ['oc1', 'ph2', 'sg2', 'th2', 'tw2', 'vn2']
     }
+    PlatformRegions = {platform: region for region, platforms in Regions.items() for platform in platforms}
 
-    def __init__(self, rate_limit_buffer: float = 0.9):
+    def __init__(self, rate_limit_buffer: float = 0.9, max_retries: int = 5, timeout: float = 10.0, pool_size: int = 10,
+                 cache_path: Optional[str] = 'tft_data/match_cache.sqlite',
+                 index_path: Optional[str] = 'tft_data/match_index.sqlite', base_url: Optional[str] = None):
         """
         Initialize TFT API client
         
         Args:
             rate_limit_buffer: Multiplier for rate limits 
+            max_retries: Retries for 429, 5xx and connection errors before giving up
+            timeout: Seconds to wait on a single request
+            pool_size: Pooled connections kept per regional host
+            cache_path: SQLite file caching finished match payloads, None disables the cache
+            index_path: SQLite match index shared with the individuals pipeline, None disables it
+            base_url: Root serving every host instead of https://{host}.api.riotgames.com, e.g. a local
+                mock server, defaults to the RIOT_API_BASE_URL environment variable
         """
         load_dotenv()
         self.api_key = os.getenv('RIOT_API_KEY')
+        self.base_url = base_url or os.getenv('RIOT_API_BASE_URL')
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.sessions = SessionPool(pool_size)
+        self.match_cache = MatchCache(cache_path) if cache_path else None
+        self.match_index = MatchIndex(index_path) if index_path else None
 
         max_per_second = int(20 * rate_limit_buffer)
         max_per_two_minutes = int(100 * rate_limit_buffer)
-        self.rate_limiter = RateLimiter(max_per_second, max_per_two_minutes)
+        self.rate_limiter = RateLimiter(max_per_second, max_per_two_minutes, buffer=rate_limit_buffer)
 
 
-    def make_request(self, url: str) -> Dict:
-        """Logic for rate limited api requests"""
-        self.rate_limiter.wait_if_needed()
-        headers = {
-            "X-Riot-Token": self.api_key
-        }
-        try:
-            response = requests.get(url, headers=headers)
+    def make_request(self, url: str, method: Optional[str] = None) -> Dict:
+        """
+        Logic for rate limited api requests
 
-            if response.status_code == 429:
-                retry_after = int(response.headers.get('Retry-After', 10))
-                print(f"Rate limited by API. Waiting {retry_after}s...")
-                time.sleep(retry_after)
-                return self.make_request(url)
-            
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            if response.status_code == 404:
-                print(f"Resource not found: {url}")
-            raise
-        except requests.exceptions.RequestException as e:
-            print(f"Request failed: {e}")
-            raise
+        Args:
+            url: Full request url
+            method: API method name used for per-method rate limits (e.g. 'match')
+        """
+        return request_json(self.sessions, url, self.api_key, self.max_retries, self.timeout, method,
+                            before_attempt=lambda: self.rate_limiter.wait_if_needed(method),
+                            after_response=lambda response: self.rate_limiter.update_from_headers(response.headers, method),
+                            throttle=self.rate_limiter.block_for)
+
+
+    def api_url(self, host: str, path: str) -> str:
+        """Full url of an API path on a platform or regional routing host"""
+        if self.base_url:
+            return f"{self.base_url.rstrip('/')}/{host}{path}"
+        return f"https://{host}.api.riotgames.com{path}"
 
 
     def get_region_routing(self, platform: str) -> str:
         """Finds the region for any given valid platform"""
-        for region, platforms in self.Regions.items():
-            if platform.lower() in platforms:
-                return region
-        raise ValueError(f"Unknown {platform}")
+        region = self.PlatformRegions.get(platform.lower())
+        if region is None:
+            raise ValueError(f"Unknown {platform}")
+        return region
 
 
     def get_challenger_league(self, platform: str):
         """Retrieves challenger players platform id for downstream processing"""
-        url = f'https://{platform}.api.riotgames.com/tft/league/v1/challenger?queue=RANKED_TFT'
-        challengers = self.make_request(url)
+        url = self.api_url(platform, '/tft/league/v1/challenger?queue=RANKED_TFT')
+        challengers = self.make_request(url, 'league')
         challenger_puuids = [entry['puuid'] for entry in challengers['entries']]
         return challenger_puuids
 
 
     def get_gm_league(self, platform: str):
         """Retrieves grandmaster players platform id for downstream processing"""
-        url = f'https://{platform}.api.riotgames.com/tft/league/v1/grandmaster?queue=RANKED_TFT'
-        gms = self.make_request(url)
+        url = self.api_url(platform, '/tft/league/v1/grandmaster?queue=RANKED_TFT')
+        gms = self.make_request(url, 'league')
         gm_puuids = []
         gm_puuids = [entry['puuid'] for entry in gms['entries']]
         return gm_puuids
 
 
-    def get_match_ids(self, puuids: List[str], platform: str, count: int = 1, start: int = 0) -> List[str]:
+    def get_player_match_ids(self, puuid: str, platform: str, count: int = 20, start: int = 0,
+                             start_time: Optional[int] = None) -> List[str]:
+        """One page of a player's match IDs, newest first, raises when the request fails"""
+        region = self.get_region_routing(platform)
+        url = self.api_url(region, f"/tft/match/v1/matches/by-puuid/{puuid}/ids?start={start}&count={count}")
+        if start_time is not None:
+            url += f"&startTime={start_time}"
+        return self.make_request(url, 'match-ids')
+
+
+    def get_match_ids(self, puuids: List[str], platform: str, count: int = 1, start: int = 0,
+                      start_time: Optional[int] = None) -> List[str]:
         """
         Get match IDs for multiple players.
         
@@ -141,18 +257,17 @@ class TFTAPIClient:
             platform: Platform identifier (e.g., 'na1')
             count: Number of matches per player
             start: Starting index for match history
+            start_time: Epoch seconds, only matches played after it are returned
             
         Returns:
-            List of unique match IDs
+            Sorted list of unique match IDs, so reruns name their raw match file the same way
         """
-        region = self.get_region_routing(platform)
+        self.get_region_routing(platform)  # unknown platforms fail before any request
         match_ids = set()
         total_players = len(puuids)
         for idx, player in enumerate(puuids, 1):
-            url = f"https://{region}.api.riotgames.com/tft/match/v1/matches/by-puuid/{player}/ids?start={start}&count={count}"
-            
             try:
-                player_matches = self.make_request(url)
+                player_matches = self.get_player_match_ids(player, platform, count, start, start_time)
                 match_ids.update(player_matches)
                 
                 if idx % 10 == 0: 
@@ -163,49 +278,224 @@ class TFTAPIClient:
                 continue
         
         print(f"Total unique matches found: {len(match_ids)}")
-        return list(match_ids)
+        return sorted(match_ids)
 
 
-    def get_multi_match_data(self, match_ids: List, platform: str):
+    def get_new_match_ids(self, puuids: List[str], platform: str, start_times: Dict[str, int],
+                          count: int = 1, page_size: int = 200, min_start_time: Optional[int] = None) -> List[str]:
         """
-        Get detailed match data for multiple matches.
-        
+        Get match IDs played since each player's last collected game.
+
+        Players with a start time are paged through with startTime until their
+        history is exhausted, players without one fall back to the latest count matches.
+
         Args:
-            match_ids: List of match IDs
-            platform: Platform identifier
-            
+            puuids: List of player PUUIDs
+            platform: Platform identifier (e.g., 'na1')
+            start_times: Epoch seconds per PUUID to collect matches from
+            count: Number of matches for players without a start time
+            page_size: Match IDs requested per page (API max 200)
+            min_start_time: Epoch seconds applied to every player, e.g. the current patch release
+
         Returns:
-            List of match data dictionaries
+            Sorted list of unique match IDs
         """
         region = self.get_region_routing(platform)
-        filepath = f'tft_data/raw_matches/{match_ids[0]}_{match_ids[-1]}_{len(match_ids)}.json'
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        data = []
-        total_matches = len(match_ids)
-        for idx, match in enumerate(match_ids, 1):
-            url = f"https://{region}.api.riotgames.com/tft/match/v1/matches/{match}"
-            
+        match_ids = set()
+        total_players = len(puuids)
+        for idx, player in enumerate(puuids, 1):
+            base_url = self.api_url(region, f"/tft/match/v1/matches/by-puuid/{player}/ids")
+            start_time = start_times.get(player)
+            if start_time is not None and min_start_time is not None:
+                start_time = max(start_time, min_start_time)
             try:
-                match_data = self.make_request(url)
-                data.append(match_data)
-                print(f'Fetched match data for {match} ({idx}/{total_matches})')
+                if start_time is None:
+                    url = f"{base_url}?start=0&count={count}"
+                    if min_start_time is not None:
+                        url += f"&startTime={min_start_time}"
+                    match_ids.update(self.make_request(url, 'match-ids'))
+                else:
+                    start = 0
+                    while True:
+                        url = f"{base_url}?start={start}&count={page_size}&startTime={start_time}"
+                        page = self.make_request(url, 'match-ids')
+                        match_ids.update(page)
+                        if len(page) < page_size:
+                            break
+                        start += page_size
+
+                if idx % 10 == 0:
+                    print(f"Processed {idx}/{total_players} players. Found {len(match_ids)} unique matches.")
 
             except Exception as e:
-                print(f"Failed to get data for match {match}: {e}")
+                print(f"Failed to get matches for player {idx}/{total_players}: {e}")
                 continue
 
-        print(f"Saving {len(data)} matches to {filepath}")
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        print(f"Total unique matches found: {len(match_ids)}")
+        return sorted(match_ids)
+
+
+    def _fetch_match(self, region: str, match_id: str) -> Optional[Dict]:
+        """Like fetch_match, but returns None instead of raising when the request fails"""
+        try:
+            return self.fetch_match(region, match_id)
+        except Exception as e:
+            print(f"Failed to get data for match {match_id}: {e}")
+            METRICS.inc('tft_matches_total', source='failed')
+            return None
+
+
+    def fetch_match(self, region: str, match_id: str) -> Dict:
+        """
+        Fetches a single match from the cache or the API, raises when the request fails
+
+        A match the index marks as fetched is requested again when its payload is no
+        longer cached, the index only saves requests and never withholds a match.
+        """
+        if self.match_cache is not None:
+            cached = self.match_cache.get(match_id)
+            if cached is not None:
+                METRICS.inc('tft_matches_total', source='cache')
+                return cached
+        url = self.api_url(region, f"/tft/match/v1/matches/{match_id}")
+        match_data = self.make_request(url, 'match')
+        if self.match_cache is not None:
+            self.match_cache.put(match_id, match_data)
+        if self.match_index is not None:
+            self.match_index.mark([match_id], FETCHED, source='leagues')
+        METRICS.inc('tft_matches_total', source='api')
+        return match_data
+
+
+    def raw_match_path(self, match_ids: List, compression: Optional[str] = None, name: Optional[str] = None) -> str:
+        """
+        Raw match file for a sweep, named after the lowest id, highest id and count unless a name is given
+
+        The name does not depend on the order of match_ids, so a rerun after a crash
+        finds and resumes the same file.
+        """
+        extension = f'.jsonl.{compression}' if compression else '.jsonl'
+        if name is None:
+            name = f'{min(match_ids)}_{max(match_ids)}_{len(match_ids)}'
+        return f'tft_data/raw_matches/{name}{extension}'
+
+
+    def iter_match_data(self, match_ids: List, platform: str, max_workers: int = 1) -> Iterator[Dict]:
+        """
+        Yields detailed match data as each match arrives.
+
+        With max_workers > 1 at most 2 * max_workers requests are queued at once, so
+        memory stays bounded no matter how many match IDs are passed. Failed matches
+        are skipped.
+        """
+        region = self.get_region_routing(platform)
+        total_matches = len(match_ids)
+        if max_workers > 1:
+            pending = iter(match_ids)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                in_flight = {executor.submit(self._fetch_match, region, match): match
+                             for match in itertools.islice(pending, max_workers * 2)}
+                done_count = 0
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        match = in_flight.pop(future)
+                        next_match = next(pending, None)
+                        if next_match is not None:
+                            in_flight[executor.submit(self._fetch_match, region, next_match)] = next_match
+                        done_count += 1
+                        match_data = future.result()
+                        if match_data is not None:
+                            print(f'Fetched match data for {match} ({done_count}/{total_matches})')
+                            yield match_data
+        else:
+            for idx, match in enumerate(match_ids, 1):
+                match_data = self._fetch_match(region, match)
+                if match_data is not None:
+                    print(f'Fetched match data for {match} ({idx}/{total_matches})')
+                    yield match_data
+
+
+    def save_multi_match_data(self, match_ids: List, platform: str, max_workers: int = 1,
+                              compression: Optional[str] = None, name: Optional[str] = None) -> str:
+        """
+        Stream detailed match data for multiple matches to a JSONL file.
+
+        Matches are written one per line as they arrive, so memory stays bounded by
+        the matches in flight. Rerunning with the same match IDs resumes the file and
+        only fetches matches that are not saved yet.
+
+        Args:
+            match_ids: List of match IDs
+            platform: Platform identifier
+            max_workers: Number of requests kept in flight, 1 fetches sequentially
+            compression: None, 'gz' or 'zst'
+            name: File name without extension, defaults to first id, last id and count
+
+        Returns:
+            Path of the match file
+        """
+        filepath = self.raw_match_path(match_ids, compression, name)
+        total_matches = len(match_ids)
+        start_time = time.time()
+
+        with MatchWriter(filepath) as writer:
+            pending = [match for match in match_ids if match not in writer.written_ids]
+            if len(pending) < total_matches:
+                print(f"Resuming {filepath}: {total_matches - len(pending)} matches already saved")
+            saved_before = writer.count
+
+            for match_data in self.iter_match_data(pending, platform, max_workers):
+                writer.write(match_data)
+
+            fetched = writer.count - saved_before
+            saved = writer.count
+
+        self.report_fetch(fetched, len(pending), time.time() - start_time, max_workers)
+        print(f"Saved {saved} matches to {filepath}")
+        return filepath
+
+
+    def report_fetch(self, fetched: int, requested: int, elapsed: float, max_workers: int):
+        """Prints throughput and match cache counters for a finished sweep"""
+        throughput = fetched / elapsed if elapsed > 0 else 0.0
+        print(f"Fetched {fetched}/{requested} matches in {elapsed:.1f}s ({throughput:.2f} matches/s, {max_workers} workers)")
+        if self.match_cache is not None:
+            stats = self.match_cache.stats()
+            print(f"Match cache: {stats['hits']} hits, {stats['misses']} misses, {stats['size_bytes'] / 1024 ** 2:.1f} MB stored")
+
+
+    def get_multi_match_data(self, match_ids: List, platform: str, max_workers: int = 1,
+                             compression: Optional[str] = None):
+        """
+        Get detailed match data for multiple matches.
+        
+        Args:
+            match_ids: List of match IDs
+            platform: Platform identifier
+            max_workers: Number of requests kept in flight, 1 fetches sequentially
+            compression: None, 'gz' or 'zst' for the saved match file
+            
+        Returns:
+            List of match data dictionaries in the same order as match_ids
+        """
+        if not match_ids:
+            return []
+        filepath = self.save_multi_match_data(match_ids, platform, max_workers, compression)
+        order = {match: idx for idx, match in enumerate(match_ids)}
+        data = [match for match in read_matches(filepath) if match['metadata']['match_id'] in order]
+        data.sort(key=lambda match: order[match['metadata']['match_id']])
         return data
 
 
 if __name__ == "__main__":
-    client = TFTAPIClient()
-    print("Fetching summoner data...")
-    challengers = client.get_challenger_league('na1')
-    gms = client.get_gm_league('na1')
-    # print(gms)
-    match_ids = client.get_match_ids(challengers, 'na1')
-    # print(match_ids)
-    client.get_multi_match_data(match_ids, 'na1')
\ No newline at end of file
+    args = add_profiling_arguments(argparse.ArgumentParser(description='TFT API Client')).parse_args()
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        client = TFTAPIClient()
+        print("Fetching summoner data...")
+        challengers = client.get_challenger_league('na1')
+        gms = client.get_gm_league('na1')
+        # print(gms)
+        match_ids = client.get_match_ids(challengers, 'na1')
+        # print(match_ids)
+        client.get_multi_match_data(match_ids, 'na1')
\ No newline at end of file
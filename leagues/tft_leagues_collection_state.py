@@ -0,0 +1,106 @@
+import os
+import sys
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_match_index import MatchIndex, PARSED
+
+
+class CollectionState:
+    """
+    Remembers what previous collection runs already ingested.
+
+    Stores the newest game time seen for each tracked PUUID, used as the startTime
+    of the next match-ids request. Which match IDs were already collected is kept in
+    the shared MatchIndex so they are never fetched again.
+    """
+    def __init__(self, path: str = 'tft_data/collection_state.sqlite', match_index: Optional[MatchIndex] = None):
+        self.path = path
+        self.match_index = match_index or MatchIndex()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS players ('
+            'puuid TEXT PRIMARY KEY, last_game_time INTEGER NOT NULL)'
+        )
+        self._migrate_matches()
+        self.conn.commit()
+
+
+    def _migrate_matches(self):
+        """Moves match IDs from the old per-state matches table into the shared match index"""
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'matches'"
+        ).fetchone()
+        if exists:
+            match_ids = [row[0] for row in self.conn.execute('SELECT match_id FROM matches')]
+            self.match_index.mark(match_ids, PARSED, source='leagues')
+            self.conn.execute('DROP TABLE matches')
+
+
+    def get_start_times(self, puuids: Iterable[str]) -> Dict[str, int]:
+        """Returns the epoch second of the newest ingested game per PUUID, unseen players are left out"""
+        puuids = list(puuids)
+        start_times = {}
+        with self._lock:
+            for i in range(0, len(puuids), 500):
+                chunk = puuids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.conn.execute(
+                    f'SELECT puuid, last_game_time FROM players WHERE puuid IN ({placeholders})', chunk
+                )
+                start_times.update(rows)
+        return start_times
+
+
+    def filter_new(self, match_ids: Iterable[str]) -> List[str]:
+        """Drops match IDs that a previous run already ingested, keeping order"""
+        return self.match_index.filter_unfetched(match_ids)
+
+
+    def record_matches(self, match_data: List[Dict], tracked_puuids: Optional[Iterable[str]] = None,
+                       unfetched_ids: Optional[Iterable[str]] = None):
+        """
+        Moves each tracked player's start time forward past the collected matches
+
+        A match that failed to fetch has no payload to tell its players or game time, so
+        when any are given no start time moves. They stay seen in the match index and the
+        next run lists the same window again, filter_new keeps only what is still missing.
+
+        Args:
+            match_data: Raw match payloads from the match-v1 endpoint
+            tracked_puuids: Players whose start time should be updated, all participants when None
+            unfetched_ids: Match IDs of this run that could not be fetched
+        """
+        unfetched_ids = list(unfetched_ids or [])
+        if unfetched_ids:
+            print(f"{len(unfetched_ids)} matches failed to fetch, start times are kept so the next run retries them")
+            return
+        tracked = set(tracked_puuids) if tracked_puuids is not None else None
+        newest = {}
+        for match in match_data:
+            game_time = match['info']['game_datetime'] // 1000
+            for puuid in match['metadata']['participants']:
+                if tracked is None or puuid in tracked:
+                    newest[puuid] = max(newest.get(puuid, 0), game_time)
+
+        with self._lock:
+            self.conn.executemany(
+                'INSERT INTO players (puuid, last_game_time) VALUES (?, ?) '
+                'ON CONFLICT(puuid) DO UPDATE SET last_game_time = MAX(last_game_time, excluded.last_game_time)',
+                list(newest.items())
+            )
+            self.conn.commit()
+
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,258 @@
+import os
+import sys
+import time
+import argparse
+from typing import Dict, Iterable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_metrics import METRICS, add_profiling_arguments, profiled
+from tft_leagues_stats_index import read_records
+
+UNIT = 'unit'
+TRAIT = 'trait'
+
+
+def board_features(record: Dict, kinds: Iterable[str] = (UNIT, TRAIT)) -> List[str]:
+    """Distinct unit and active trait features of a parsed board, e.g. unit:TFT16_Ahri and trait:TFT16_Sorcerer:2"""
+    features = set()
+    if UNIT in kinds:
+        features.update(f"unit:{unit['character_id']}" for unit in record['units'])
+    if TRAIT in kinds:
+        features.update(f"trait:{trait['name']}:{trait['tier']}" for trait in record['traits'])
+    return list(features)
+
+
+class CompositionBitsets:
+    """
+    Boards encoded as one bitset per unit or active trait, for co-occurrence mining.
+
+    Row f of bits is a uint64 bitset over all boards with bit b set when board b has
+    feature f. Boards are laid out sorted by placement with each placement's block
+    padded to whole 64-bit words, so counting a combination per placement is one AND
+    across feature rows, a popcount per word and a sum per placement block.
+    """
+    def __init__(self, features: List[str], bits: np.ndarray, placements: np.ndarray, block_starts: np.ndarray,
+                 block_counts: np.ndarray):
+        """
+        Args:
+            features: Feature name of each bitset row
+            bits: (features, words) uint64 bitsets
+            placements: Placement of each block, ascending
+            block_starts: First word of each placement block
+            block_counts: Boards in each placement block
+        """
+        self.features = features
+        self.bits = bits
+        self.placements = placements
+        self.block_starts = block_starts
+        self.block_counts = block_counts
+        self.index = {feature: i for i, feature in enumerate(features)}
+
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict], kinds: Iterable[str] = (UNIT, TRAIT)):
+        """Encodes parsed participant records (parse_data output)"""
+        kinds = tuple(kinds)
+        placements, board_ids, feature_ids = [], [], []
+        features = {}
+        for board, record in enumerate(records):
+            placements.append(record['placement'])
+            for feature in board_features(record, kinds):
+                board_ids.append(board)
+                feature_ids.append(features.setdefault(feature, len(features)))
+        return cls._build(list(features), np.asarray(placements), np.asarray(board_ids, dtype=np.int64),
+                          np.asarray(feature_ids, dtype=np.int64))
+
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, kinds: Iterable[str] = (UNIT, TRAIT)):
+        """Encodes a wide cleaned dataframe (dataframe_prep layout) without a Python loop over boards"""
+        kinds = tuple(kinds)
+        columns = []
+        positions = np.arange(len(df))
+        for col in df.columns:
+            if UNIT in kinds and col.startswith('unit_') and col.endswith('_character_id'):
+                columns.append(('unit:' + df[col].astype('string'), df[col].notna()))
+            elif TRAIT in kinds and col.startswith('trait_') and col.endswith('_name'):
+                tier = df[col.replace('_name', '_tier')]
+                present = df[col].notna() & tier.notna()
+                values = 'trait:' + df[col].astype('string') + ':' + tier.astype('Int64').astype('string')
+                columns.append((values, present))
+
+        board_ids = np.concatenate([positions[present.to_numpy()] for _, present in columns])
+        values = pd.concat([values[present] for values, present in columns], ignore_index=True)
+        feature_ids, features = pd.factorize(values)
+        return cls._build(list(features), df['placement'].to_numpy(), board_ids, feature_ids.astype(np.int64))
+
+
+    @classmethod
+    def _build(cls, features: List[str], placements: np.ndarray, board_ids: np.ndarray, feature_ids: np.ndarray):
+        block_placements, counts = np.unique(placements, return_counts=True)
+        block_words = (counts + 63) // 64
+        block_starts = np.concatenate([[0], np.cumsum(block_words)[:-1]])
+
+        # slot of each board once the boards are sorted by placement, each block starting on a word boundary
+        order = np.argsort(placements, kind='stable')
+        rank = np.empty(len(placements), dtype=np.int64)
+        block = np.searchsorted(block_placements, placements[order])
+        rank[order] = block_starts[block] * 64 + (np.arange(len(order)) - np.concatenate([[0], np.cumsum(counts)[:-1]])[block])
+
+        bits = np.zeros((len(features), int(block_words.sum())), dtype=np.uint64)
+        slots = rank[board_ids]
+        np.bitwise_or.at(bits, (feature_ids, slots >> 6), np.left_shift(np.uint64(1), (slots & 63).astype(np.uint64)))
+        return cls(features, bits, block_placements, block_starts, counts)
+
+
+    @property
+    def n_boards(self) -> int:
+        return int(self.block_counts.sum())
+
+
+    def _placement_counts(self, bitsets: np.ndarray) -> np.ndarray:
+        """(rows, placements) number of boards per placement of each bitset row"""
+        return np.add.reduceat(np.bitwise_count(bitsets).astype(np.int64), self.block_starts, axis=1)
+
+
+    def _summary(self, counts: np.ndarray) -> Dict[str, np.ndarray]:
+        """count, top-4 rate, average placement and top-4 lift over all boards from per-placement counts"""
+        total = counts.sum(axis=1)
+        top4 = counts[:, self.placements <= 4].sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            top4_rate = top4 / total
+            avg_placement = (counts * self.placements).sum(axis=1) / total
+        base_top4 = self.block_counts[self.placements <= 4].sum() / self.block_counts.sum()
+        return {'count': total, 'top4_rate': top4_rate, 'avg_placement': avg_placement,
+                'lift': top4_rate / base_top4}
+
+
+    def singles(self) -> pd.DataFrame:
+        """Per-feature board count, top-4 rate, average placement and lift"""
+        return pd.DataFrame({'a': self.features, **self._summary(self._placement_counts(self.bits))})
+
+
+    def pairs(self, min_count: int = 1, max_workers: Optional[int] = None) -> pd.DataFrame:
+        """
+        Every pair of features seen together on at least min_count boards
+
+        Returns:
+            a, b, count, top4_rate, avg_placement, lift (top-4 rate over the all-board
+            rate) and synergy (top-4 rate over the better of a and b alone)
+        """
+        singles = self.singles()
+        frequent = np.flatnonzero(singles['count'].to_numpy() >= min_count)
+        bits = self.bits[frequent]
+
+        def pair_rows(i):
+            counts = self._placement_counts(bits[i] & bits[i + 1:])
+            keep = np.flatnonzero(counts.sum(axis=1) >= min_count)
+            return i, i + 1 + keep, counts[keep]
+
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            results = list(executor.map(pair_rows, range(len(frequent))))
+        return self._frame(singles, ['a', 'b'], [(frequent[[i] * len(js)], frequent[js]) for i, js, _ in results],
+                           [counts for _, _, counts in results])
+
+
+    def triples(self, min_count: int = 1, max_workers: Optional[int] = None, pairs: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        Every triple of features seen together on at least min_count boards
+
+        Only extends pairs that already reach min_count, since a triple is never more
+        frequent than any of its pairs.
+        """
+        singles = self.singles()
+        if pairs is None:
+            pairs = self.pairs(min_count, max_workers)
+        pairs = pairs[pairs['count'] >= min_count]
+        # partners[i] holds every later feature j with a frequent (i, j) pair
+        partners = {}
+        for i, j in zip(pairs['a'].map(self.index), pairs['b'].map(self.index)):
+            i, j = min(i, j), max(i, j)
+            partners.setdefault(i, set()).add(j)
+
+        def triple_rows(pair):
+            i, j = pair
+            candidates = np.array(sorted(partners[i] & partners.get(j, set())), dtype=np.int64)
+            if not len(candidates):
+                return pair, candidates, np.zeros((0, len(self.placements)), dtype=np.int64)
+            counts = self._placement_counts((self.bits[i] & self.bits[j]) & self.bits[candidates])
+            keep = np.flatnonzero(counts.sum(axis=1) >= min_count)
+            return pair, candidates[keep], counts[keep]
+
+        ordered = [(i, j) for i in sorted(partners) for j in sorted(partners[i])]
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            results = list(executor.map(triple_rows, ordered))
+        columns = [(np.full(len(ks), i), np.full(len(ks), j), ks) for (i, j), ks, _ in results]
+        return self._frame(singles, ['a', 'b', 'c'], columns, [counts for _, _, counts in results])
+
+
+    def _frame(self, singles: pd.DataFrame, names: List[str], columns: List[Tuple[np.ndarray, ...]],
+               counts: List[np.ndarray]) -> pd.DataFrame:
+        if not columns or not sum(len(part[0]) for part in columns):
+            return pd.DataFrame(columns=names + ['count', 'top4_rate', 'avg_placement', 'lift', 'synergy'])
+        ids = [np.concatenate([part[n] for part in columns]).astype(np.int64) for n in range(len(names))]
+        df = pd.DataFrame({name: np.asarray(self.features, dtype=object)[col] for name, col in zip(names, ids)})
+        for key, values in self._summary(np.concatenate(counts)).items():
+            df[key] = values
+        single_rates = singles['top4_rate'].to_numpy()
+        df['synergy'] = df['top4_rate'] - np.max([single_rates[col] for col in ids], axis=0)
+        return df.sort_values('count', ascending=False, ignore_index=True)
+
+
+def load_records(paths: Iterable[str]) -> Iterable[Dict]:
+    """Parsed records of every file or folder of parsed or raw match files"""
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if filename.endswith(('.json', '.jsonl', '.jsonl.gz', '.jsonl.zst')) and not filename.startswith('tmp_'):
+                    yield from read_records(os.path.join(path, filename))
+        else:
+            yield from read_records(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TFT Composition Co-occurrence')
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='Parsed or raw match files or folders')
+    parser.add_argument('--kinds', type=str, nargs='+', choices=[UNIT, TRAIT], default=[UNIT, TRAIT],
+                        help='Features to combine (default: unit trait)')
+    parser.add_argument('--min-count', type=int, default=100,
+                        help='Boards a combination must appear on (default: 100)')
+    parser.add_argument('--triples', action='store_true',
+                        help='Also mine unit/trait triples')
+    parser.add_argument('--sort', type=str, choices=['count', 'lift', 'synergy', 'avg_placement'], default='lift',
+                        help='Order of the report (default: lift)')
+    parser.add_argument('--top', type=int, default=30,
+                        help='Rows to print (default: 30)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Threads (default: number of CPUs)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write the full report to this csv')
+    add_profiling_arguments(parser)
+
+    args = parser.parse_args()
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        start = time.time()
+        with METRICS.stage('encode') as stage:
+            bitsets = CompositionBitsets.from_records(load_records(args.paths), kinds=args.kinds)
+            stage.records = bitsets.n_boards
+        print(f"Encoded {bitsets.n_boards} boards x {len(bitsets.features)} features in {time.time() - start:.1f}s")
+        start = time.time()
+        with METRICS.stage('mine') as stage:
+            report = bitsets.pairs(args.min_count, args.workers)
+            if args.triples:
+                triples = bitsets.triples(args.min_count, args.workers, pairs=report)
+                report = pd.concat([report, triples], ignore_index=True)
+            stage.records = len(report)
+        print(f"Mined {len(report)} combinations in {time.time() - start:.1f}s")
+        report = report.sort_values(args.sort, ascending=args.sort == 'avg_placement', ignore_index=True)
+        print(report.head(args.top).to_string())
+        if args.output:
+            report.to_csv(args.output, index=False)
+            print(f"Saving Co-occurrence Report to {args.output}")
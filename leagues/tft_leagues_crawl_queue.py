@@ -0,0 +1,574 @@
+import os
+import sys
+import time
+import signal
+import socket
+import sqlite3
+import argparse
+import multiprocessing
+import threading
+import contextlib
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_leagues_api_client import TFTAPIClient
+from tft_codec import dumps, loads
+from tft_leagues_crawler import TFTLadderCrawler
+from tft_leagues_data_cleaning import TFTDataCleaner, patch_window, write_output
+from tft_http import backoff_delay
+from tft_leagues_match_data import parse_matches
+from tft_match_filter import MatchFilter
+from tft_match_index import MatchIndex, PARSED, SEEN
+from tft_leagues_match_store import MatchWriter, read_matches
+from tft_metrics import METRICS, add_profiling_arguments, profiled
+from tft_patches import PatchRegistry
+from tft_leagues_reprocess import raw_dataset_name
+
+LEAGUE = 'league'
+MATCH_IDS = 'match-ids'
+MATCH = 'match'
+# deeper tasks are claimed first, so finished work reaches the raw files before more is discovered
+PRIORITIES = {LEAGUE: 0, MATCH_IDS: 1, MATCH: 2}
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+MATCH_IDS_PAGE = 200  # largest count match-v1 accepts
+
+
+class Task(NamedTuple):
+    id: int
+    kind: str
+    key: str
+    payload: Dict
+    attempts: int
+    checkpoint: Optional[Dict]
+
+
+class CrawlQueue:
+    """
+    Persistent SQLite work queue of a crawl's league, match-ids and match tasks.
+
+    A task is pending until a worker claims it, which leases it as running for
+    lease_seconds. Workers then complete it, checkpoint progress (which extends the
+    lease) or fail it back to pending with a backoff, until max_attempts marks it
+    failed. A worker that is killed simply lets its lease run out and the task is
+    claimed again, so a crawl is stopped by killing it and resumed by rerunning it.
+
+    Claims run in an IMMEDIATE transaction, so any number of worker processes can
+    pull from the same file. Tasks found by a task are enqueued in the same
+    transaction that checkpoints or completes it, and (crawl, kind, key) is unique,
+    so no task is lost or queued twice. Delivery is at least once: a task whose
+    worker died after doing the work but before completing it runs again.
+    """
+    def __init__(self, crawl: str, path: str = 'tft_data/crawl_queue.sqlite', lease_seconds: float = 600.0,
+                 max_attempts: int = 5):
+        """
+        Args:
+            crawl: Name of the crawl, one file can hold any number of crawls
+            path: SQLite database file
+            lease_seconds: How long a claimed task is kept from other workers without a checkpoint
+            max_attempts: Claims of a task before it is marked failed
+        """
+        self.crawl = crawl
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # autocommit, transactions are opened explicitly in _transaction
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            'id INTEGER PRIMARY KEY, crawl TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL, '
+            'payload TEXT NOT NULL, priority INTEGER NOT NULL, state TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, not_before REAL NOT NULL DEFAULT 0, owner TEXT, '
+            'lease_expires REAL, checkpoint TEXT, error TEXT, updated REAL NOT NULL, '
+            'UNIQUE (crawl, kind, key))'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (crawl, state, priority DESC, id)')
+
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Write transaction that locks the database up front, so concurrent claims never interleave"""
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+
+    def _insert(self, conn: sqlite3.Connection, tasks: Iterable[Tuple[str, str, Dict]]) -> int:
+        now = time.time()
+        before = conn.total_changes
+        conn.executemany(
+            'INSERT OR IGNORE INTO tasks (crawl, kind, key, payload, priority, state, updated) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(self.crawl, kind, key, dumps(payload), PRIORITIES[kind], PENDING, now) for kind, key, payload in tasks]
+        )
+        return conn.total_changes - before
+
+
+    def enqueue(self, tasks: Iterable[Tuple[str, str, Dict]]) -> int:
+        """Adds (kind, key, payload) tasks, keys already in the crawl are ignored. Returns the tasks added"""
+        with self._transaction() as conn:
+            return self._insert(conn, tasks)
+
+
+    def claim(self, owner: str, limit: int = 1) -> List[Task]:
+        """
+        Leases up to limit runnable tasks to owner, highest priority first
+
+        Tasks whose lease expired go back to pending first, or to failed once they
+        used up their attempts.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, owner = NULL, "
+                "error = 'lease expired', updated = ? WHERE crawl = ? AND state = ? AND lease_expires < ?",
+                (self.max_attempts, FAILED, PENDING, now, self.crawl, RUNNING, now)
+            )
+            rows = conn.execute(
+                'SELECT id, kind, key, payload, attempts, checkpoint FROM tasks '
+                'WHERE crawl = ? AND state = ? AND not_before <= ? ORDER BY priority DESC, id LIMIT ?',
+                (self.crawl, PENDING, now, limit)
+            ).fetchall()
+            conn.executemany(
+                'UPDATE tasks SET state = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, updated = ? '
+                'WHERE id = ?',
+                [(RUNNING, owner, now + self.lease_seconds, now, row[0]) for row in rows]
+            )
+        return [Task(task_id, kind, key, loads(payload), attempts + 1, loads(checkpoint) if checkpoint else None)
+                for task_id, kind, key, payload, attempts, checkpoint in rows]
+
+
+    def checkpoint(self, task: Task, checkpoint: Dict, new_tasks: Iterable[Tuple[str, str, Dict]] = ()) -> Task:
+        """Saves a running task's progress with the tasks found so far and renews its lease"""
+        now = time.time()
+        with self._transaction() as conn:
+            self._insert(conn, new_tasks)
+            conn.execute('UPDATE tasks SET checkpoint = ?, lease_expires = ?, updated = ? WHERE id = ?',
+                         (dumps(checkpoint), now + self.lease_seconds, now, task.id))
+        return task._replace(checkpoint=checkpoint)
+
+
+    def complete(self, task: Task, new_tasks: Iterable[Tuple[str, str, Dict]] = ()):
+        """Marks a task done and enqueues the tasks it found"""
+        with self._transaction() as conn:
+            self._insert(conn, new_tasks)
+            conn.execute('UPDATE tasks SET state = ?, owner = NULL, error = NULL, updated = ? WHERE id = ?',
+                         (DONE, time.time(), task.id))
+
+
+    def fail(self, task: Task, error: str):
+        """Retries a task after a backoff, or marks it failed once it used up its attempts"""
+        now = time.time()
+        state = FAILED if task.attempts >= self.max_attempts else PENDING
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE tasks SET state = ?, owner = NULL, not_before = ?, error = ?, updated = ? WHERE id = ?',
+                (state, now + backoff_delay(task.attempts, base=5.0, cap=300.0), error, now, task.id)
+            )
+
+
+    def release(self, task: Task):
+        """Hands a task back unfinished without using up an attempt, used when a worker is stopped"""
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE tasks SET state = ?, owner = NULL, attempts = MAX(attempts - 1, 0), updated = ? '
+                'WHERE id = ? AND state = ?',
+                (PENDING, time.time(), task.id, RUNNING)
+            )
+
+
+    def retry_failed(self) -> int:
+        """Moves failed tasks back to pending with fresh attempts. Returns the tasks moved"""
+        with self._transaction() as conn:
+            return conn.execute(
+                'UPDATE tasks SET state = ?, attempts = 0, not_before = 0, error = NULL, updated = ? '
+                'WHERE crawl = ? AND state = ?',
+                (PENDING, time.time(), self.crawl, FAILED)
+            ).rowcount
+
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Tasks per kind and state"""
+        with self._lock:
+            rows = self.conn.execute('SELECT kind, state, COUNT(*) FROM tasks WHERE crawl = ? GROUP BY kind, state',
+                                     (self.crawl,))
+            counts = {}
+            for kind, state, count in rows:
+                counts.setdefault(kind, {})[state] = count
+        return counts
+
+
+    def unfinished(self) -> int:
+        """Tasks that are pending or running"""
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM tasks WHERE crawl = ? AND state IN (?, ?)',
+                                     (self.crawl, PENDING, RUNNING)).fetchone()[0]
+
+
+    def failures(self, limit: int = 20) -> List[Tuple[str, str, int, str]]:
+        """(kind, key, attempts, error) of the most recently failed tasks"""
+        with self._lock:
+            return self.conn.execute(
+                'SELECT kind, key, attempts, error FROM tasks WHERE crawl = ? AND state = ? '
+                'ORDER BY updated DESC LIMIT ?',
+                (self.crawl, FAILED, limit)
+            ).fetchall()
+
+
+    @staticmethod
+    def crawls(path: str = 'tft_data/crawl_queue.sqlite') -> Dict[str, Dict[str, int]]:
+        """Tasks per state of every crawl in a queue file"""
+        if not os.path.exists(path):
+            return {}
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            crawls = {}
+            for crawl, state, count in conn.execute('SELECT crawl, state, COUNT(*) FROM tasks GROUP BY crawl, state'):
+                crawls.setdefault(crawl, {})[state] = count
+            return crawls
+        finally:
+            conn.close()
+
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class CrawlWorker:
+    """
+    Runs a crawl's tasks until its queue holds nothing pending or running
+
+    league tasks enqueue a match-ids task per ladder player, match-ids tasks page
+    through a player's history with a checkpoint after every page and enqueue a match
+    task per match, and match tasks append the match to the worker's own raw match
+    file.
+    """
+    def __init__(self, queue: CrawlQueue, client: TFTAPIClient, raw_path: str, owner: Optional[str] = None,
+                 poll_interval: float = 2.0):
+        """
+        Args:
+            queue: Queue of the crawl
+            client: API client of this worker
+            raw_path: Raw match file only this worker appends to
+            owner: Name the worker's leases are held under, defaults to host and process id
+            poll_interval: Seconds to wait when every unfinished task is leased to another worker
+        """
+        self.queue = queue
+        self.client = client
+        self.raw_path = raw_path
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = poll_interval
+        self.processed = {LEAGUE: 0, MATCH_IDS: 0, MATCH: 0}
+        self.failed = 0
+        self.writer = None
+
+
+    def run(self) -> Dict[str, int]:
+        """Works until the crawl is finished. Returns the tasks this worker completed per kind"""
+        # the file is opened on the first write, so workers that fetch nothing leave none behind
+        self.writer = MatchWriter(self.raw_path)
+        try:
+            while True:
+                tasks = self.queue.claim(self.owner)
+                if not tasks:
+                    if not self.queue.unfinished():
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                for task in tasks:
+                    self.run_task(task)
+        finally:
+            self.writer.close()
+        return self.processed
+
+
+    def run_task(self, task: Task):
+        try:
+            with METRICS.stage(f'crawl_{task.kind}'):
+                if task.kind == LEAGUE:
+                    self.run_league(task)
+                elif task.kind == MATCH_IDS:
+                    self.run_match_ids(task)
+                else:
+                    self.run_match(task)
+        except KeyboardInterrupt:
+            self.queue.release(task)
+            raise
+        except Exception as e:
+            print(f"[{self.owner}] {task.kind} task {task.key} failed (attempt {task.attempts}): {e}")
+            METRICS.inc('tft_crawl_task_failures_total', kind=task.kind)
+            self.failed += 1
+            self.queue.fail(task, repr(e))
+            return
+        self.processed[task.kind] += 1
+        METRICS.inc('tft_crawl_tasks_total', kind=task.kind)
+
+
+    def run_league(self, task: Task):
+        platform, tier = task.payload['platform'], task.payload['tier']
+        if tier == 'challenger':
+            puuids = self.client.get_challenger_league(platform)
+        else:
+            puuids = self.client.get_gm_league(platform)
+        print(f"[{self.owner}] {platform} {tier}: {len(puuids)} ladder players")
+        history = {'platform': platform, 'count': task.payload['count'], 'start_time': task.payload['start_time']}
+        self.queue.complete(task, [(MATCH_IDS, f'{platform}:{puuid}', {**history, 'puuid': puuid})
+                                   for puuid in puuids])
+
+
+    def run_match_ids(self, task: Task):
+        payload = task.payload
+        start = task.checkpoint['start'] if task.checkpoint else 0
+        match_tasks = []
+        while start < payload['count']:
+            page_size = min(MATCH_IDS_PAGE, payload['count'] - start)
+            page = self.client.get_player_match_ids(payload['puuid'], payload['platform'], page_size, start,
+                                                    payload['start_time'])
+            start += len(page)
+            if self.client.match_index is not None:
+                self.client.match_index.mark(page, SEEN, source='leagues')
+            # every ID is queued, matches fetched by other runs are served from the match cache
+            match_tasks = [(MATCH, match_id, {'platform': payload['platform']}) for match_id in page]
+            if len(page) < page_size or start >= payload['count']:
+                break
+            task = self.queue.checkpoint(task, {'start': start}, match_tasks)
+            match_tasks = []
+        self.queue.complete(task, match_tasks)
+
+
+    def run_match(self, task: Task):
+        if task.key not in self.writer.written_ids:
+            region = self.client.get_region_routing(task.payload['platform'])
+            self.writer.write(self.client.fetch_match(region, task.key))
+        self.queue.complete(task)
+
+
+def _stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+def crawl_worker(crawl: str, queue_path: str, raw_dir: str, compression: Optional[str] = None,
+                 rate_limit_buffer: float = 0.9, lease_seconds: float = 600.0,
+                 max_attempts: int = 5) -> Dict[str, int]:
+    """
+    Runs one CrawlWorker, in a worker process or the main one
+
+    Every worker opens its own queue connection and API client. The rate limiter
+    syncs its counts from the response headers, so workers sharing a key see each
+    other's requests and every one keeps the full rate_limit_buffer. SIGTERM hands the
+    current task back like Ctrl-C does, so preempted machines lose no attempts.
+
+    Returns:
+        Tasks completed per kind
+    """
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
+    queue = CrawlQueue(crawl, queue_path, lease_seconds, max_attempts)
+    client = TFTAPIClient(rate_limit_buffer=rate_limit_buffer)
+    extension = f'.jsonl.{compression}' if compression else '.jsonl'
+    raw_path = os.path.join(raw_dir, f'crawl_{crawl}_{socket.gethostname()}_{os.getpid()}{extension}')
+    worker = CrawlWorker(queue, client, raw_path)
+    try:
+        return worker.run()
+    finally:
+        client.sessions.close()
+        queue.close()
+
+
+def crawl_raw_files(crawl: str, raw_dir: str = 'tft_data/raw_matches') -> List[str]:
+    """Raw match files written by the workers of a crawl"""
+    if not os.path.isdir(raw_dir):
+        return []
+    return sorted(os.path.join(raw_dir, filename) for filename in os.listdir(raw_dir)
+                  if filename.startswith(f'crawl_{crawl}_') and raw_dataset_name(filename) is not None)
+
+
+def unique_matches(paths: Iterable[str], match_ids: Set[str]) -> Iterator[Dict]:
+    """Matches of every file whose ID is not in match_ids yet, adding them as they are read"""
+    for path in paths:
+        for match in read_matches(path, typed=True):
+            match_id = match['metadata']['match_id']
+            if match_id not in match_ids:
+                match_ids.add(match_id)
+                yield match
+
+
+def clean_crawl(crawl: str, paths: List[str], set_number: Optional[int], released_after: Optional[datetime],
+                output_format: str = 'csv', layout: str = 'wide') -> Tuple[int, int]:
+    """
+    Parses and cleans every raw match file of a crawl into one output named crawl_<crawl>
+
+    A match can be in two workers' files when a worker died between writing it and
+    completing its task, so matches are deduplicated by ID across files.
+
+    Returns:
+        Matches read and records written
+    """
+    match_filter = MatchFilter(set_number=set_number, released_after=released_after)
+    match_ids = set()
+    records = [record for record in parse_matches(unique_matches(paths, match_ids)) if match_filter(record)]
+    if records:
+        name = f'crawl_{crawl}'
+        write_output(TFTDataCleaner(file=(records, name)), records, name, output_format, layout)
+    MatchIndex().mark(match_ids, PARSED, source='leagues')
+    return len(match_ids), len(records)
+
+
+def print_counts(queue: CrawlQueue):
+    for kind, states in sorted(queue.counts().items(), key=lambda item: PRIORITIES[item[0]]):
+        print(f"{kind:<10} " + '  '.join(f"{state} {states.get(state, 0):>7}"
+                                          for state in (PENDING, RUNNING, DONE, FAILED)))
+
+
+def crawl_queue_main(crawl: str, platforms: List[str], tiers: Iterable[str] = TFTLadderCrawler.Tiers, count: int = 20,
+                     workers: int = 1, compression: Optional[str] = None, patch: Optional[str] = None,
+                     queue_path: str = 'tft_data/crawl_queue.sqlite', raw_dir: str = 'tft_data/raw_matches',
+                     lease_seconds: float = 600.0, max_attempts: int = 5, output_format: Optional[str] = 'csv',
+                     layout: str = 'wide') -> List[str]:
+    """
+    Runs or resumes a crawl from its persistent queue
+
+    The first run seeds a league task per platform and tier, later runs with the same
+    crawl name pick up whatever is left. Once nothing is pending or running, the
+    crawl's raw match files are parsed and cleaned into one output, see clean_crawl.
+
+    Args:
+        crawl: Crawl name, rerun with the same name to resume
+        platforms: Platforms whose ladders are crawled
+        tiers: Ladders to sweep, any of 'challenger' and 'grandmaster'
+        count: Matches per player
+        workers: Worker processes pulling tasks, more can join from other shells with --workers
+        compression: None, 'gz' or 'zst' for the raw match files
+        patch: Patch from tft_patches.json whose matches are collected and kept, defaults to the latest
+        output_format: csv, parquet or arrow for the cleaned output, None skips cleaning
+
+    Returns:
+        The crawl's raw match files
+    """
+    start = time.time()
+    set_number, release = patch_window(PatchRegistry(), patch)
+    queue = CrawlQueue(crawl, queue_path, lease_seconds, max_attempts)
+    for platform in platforms:
+        if platform.lower() not in TFTAPIClient.PlatformRegions:
+            raise ValueError(f"Unknown {platform}")
+    seeded = queue.enqueue(
+        (LEAGUE, f'{platform}:{tier}',
+         {'platform': platform, 'tier': tier, 'count': count, 'start_time': int(release.timestamp())})
+        for platform in platforms for tier in tiers
+    )
+    print(f"Crawl {crawl}: " + (f"seeded {seeded} league tasks" if seeded else "resuming"))
+    print_counts(queue)
+
+    arguments = (crawl, queue_path, raw_dir, compression, 0.9, lease_seconds, max_attempts)
+    done_before = {kind: states.get(DONE, 0) for kind, states in queue.counts().items()}
+    with METRICS.stage('crawl_queue') as stage:
+        if workers <= 1:
+            crawl_worker(*arguments)
+        else:
+            # independent processes rather than a pool, so a worker that dies only loses its
+            # leased task; stages inside the workers are not recorded, the parent times the crawl
+            processes = [multiprocessing.Process(target=crawl_worker, args=arguments) for _ in range(workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+                if process.exitcode:
+                    print(f"Crawl worker {process.pid} exited with code {process.exitcode}")
+        counts = queue.counts()
+        completed = {kind: counts.get(kind, {}).get(DONE, 0) - done_before.get(kind, 0) for kind in PRIORITIES}
+        stage.records = completed[MATCH]
+
+    print(f"Crawl {crawl}: completed {completed[LEAGUE]} league, {completed[MATCH_IDS]} match-ids and "
+          f"{completed[MATCH]} match tasks in {time.time() - start:.1f}s")
+    print_counts(queue)
+    paths = crawl_raw_files(crawl, raw_dir)
+    if queue.unfinished():
+        print(f"Crawl {crawl} is not finished, rerun it to resume")
+    elif output_format is not None:
+        with METRICS.stage('clean') as stage:
+            matches, stage.records = clean_crawl(crawl, paths, set_number, release, output_format, layout)
+        print(f"Crawl {crawl}: {stage.records} records kept from {matches} matches in {len(paths)} raw files")
+    failures = queue.failures()
+    if failures:
+        print("Failed tasks (rerun with retry to try them again):")
+        for kind, key, attempts, error in failures:
+            print(f"  {kind} {key} after {attempts} attempts: {error}")
+    queue.close()
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TFT Resumable Crawl Queue')
+    parser.add_argument('--queue', type=str, default='tft_data/crawl_queue.sqlite',
+                        help='Queue database (default: tft_data/crawl_queue.sqlite)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Start or resume a crawl')
+    run.add_argument('--crawl', type=str, default=None,
+                     help='Crawl name, reuse it to resume (default: <platforms>_<date>)')
+    run.add_argument('--platforms', type=str, nargs='+', choices=list(TFTAPIClient.PlatformRegions),
+                     default=['na1'], help='Platforms to crawl (default: na1)')
+    run.add_argument('--tiers', type=str, nargs='+', choices=list(TFTLadderCrawler.Tiers),
+                     default=list(TFTLadderCrawler.Tiers),
+                     help='Ladders to sweep (default: challenger grandmaster)')
+    run.add_argument('--count', type=int, default=20,
+                     help='Matches per player (default: 20)')
+    run.add_argument('--workers', type=int, default=1,
+                     help='Worker processes pulling tasks (default: 1)')
+    run.add_argument('--compression', type=str, choices=['gz', 'zst'], default=None,
+                     help='Compress the raw match files (default: none)')
+    run.add_argument('--patch', type=str, default=None,
+                     help='Patch from tft_patches.json to collect, e.g. 16.1c (default: latest)')
+    run.add_argument('--lease', type=float, default=600.0,
+                     help='Seconds before a task of a dead worker is handed out again (default: 600)')
+    run.add_argument('--max-attempts', type=int, default=5,
+                     help='Attempts before a task is marked failed (default: 5)')
+    run.add_argument('--format', type=str, choices=['csv', 'parquet', 'arrow', 'none'], default='csv',
+                     help='Cleaned output format once the crawl is finished, none skips cleaning (default: csv)')
+    run.add_argument('--layout', type=str, choices=['wide', 'long'], default='wide',
+                     help='wide: one row per board with unit_i columns, long: boards/units/unit_items/traits tables (default: wide)')
+    add_profiling_arguments(run)
+
+    status = commands.add_parser('status', help='Task counts of one or every crawl')
+    status.add_argument('--crawl', type=str, default=None)
+
+    retry = commands.add_parser('retry', help='Move the failed tasks of a crawl back to pending')
+    retry.add_argument('--crawl', type=str, required=True)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        crawl = args.crawl or f"{'_'.join(args.platforms)}_{datetime.now().strftime('%Y%m%d')}"
+        with profiled(args.metrics, args.profile, args.trace_memory):
+            crawl_queue_main(crawl, args.platforms, args.tiers, args.count, args.workers, args.compression,
+                             args.patch, args.queue, lease_seconds=args.lease, max_attempts=args.max_attempts,
+                             output_format=None if args.format == 'none' else args.format, layout=args.layout)
+    elif args.command == 'status' and args.crawl is None:
+        for crawl, states in sorted(CrawlQueue.crawls(args.queue).items()):
+            print(f"{crawl:<32} " + '  '.join(f"{state} {states.get(state, 0):>7}"
+                                               for state in (PENDING, RUNNING, DONE, FAILED)))
+    elif args.command == 'status':
+        queue = CrawlQueue(args.crawl, args.queue)
+        print_counts(queue)
+        for kind, key, attempts, error in queue.failures():
+            print(f"  failed {kind} {key} after {attempts} attempts: {error}")
+    else:
+        moved = CrawlQueue(args.crawl, args.queue).retry_failed()
+        print(f"Moved {moved} failed tasks of {args.crawl} back to pending, rerun the crawl to process them")
@@ -0,0 +1,167 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from typing import Dict, Iterable, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_leagues_api_client import TFTAPIClient
+from tft_match_cache import MatchCache
+from tft_match_index import MatchIndex, SEEN
+from tft_metrics import METRICS, add_profiling_arguments, profiled
+
+
+class MatchIdRegistry:
+    """Thread-safe set of match IDs already claimed by a crawl worker"""
+    def __init__(self):
+        self.seen = set()
+        self._lock = threading.Lock()
+
+
+    def claim(self, match_ids: Iterable[str]) -> List[str]:
+        """Returns the match IDs no other worker has claimed yet and marks them as claimed"""
+        with self._lock:
+            new_ids = [match_id for match_id in match_ids if match_id not in self.seen]
+            self.seen.update(new_ids)
+        return new_ids
+
+
+class TFTLadderCrawler:
+    """
+    Sweeps the challenger and grandmaster ladders of every platform at once.
+
+    Runs one worker per regional routing host (americas, asia, europe, sea). Each worker
+    has its own TFTAPIClient, and with it its own rate limiter, since Riot enforces limits
+    per routing host. Match IDs are deduplicated across all workers and each region's
+    matches are written to their own raw match file.
+    """
+    Tiers = ('challenger', 'grandmaster')
+
+    def __init__(self, regions: Optional[List[str]] = None, tiers: Iterable[str] = Tiers,
+                 rate_limit_buffer: float = 0.9):
+        """
+        Args:
+            regions: Regional routing values to crawl, defaults to all of TFTAPIClient.Regions
+            tiers: Ladders to sweep, any of 'challenger' and 'grandmaster'
+            rate_limit_buffer: Multiplier for each worker's rate limits
+        """
+        self.regions = regions or list(TFTAPIClient.Regions)
+        self.tiers = tuple(tiers)
+        for tier in self.tiers:
+            if tier not in self.Tiers:
+                raise ValueError(f"Unknown tier {tier}")
+        self.rate_limit_buffer = rate_limit_buffer
+        self.match_ids = MatchIdRegistry()
+        self.match_cache = MatchCache()
+        self.match_index = MatchIndex()
+
+
+    def get_ladder_puuids(self, client: TFTAPIClient, platform: str) -> List[str]:
+        puuids = []
+        for tier in self.tiers:
+            try:
+                if tier == 'challenger':
+                    puuids.extend(client.get_challenger_league(platform))
+                else:
+                    puuids.extend(client.get_gm_league(platform))
+            except Exception as e:
+                print(f"Failed to get {tier} ladder for {platform}: {e}")
+        return list(dict.fromkeys(puuids))
+
+
+    def crawl_region(self, region: str, count: int = 5, max_workers: int = 1, compression: Optional[str] = None,
+                     start_time: Optional[int] = None) -> Optional[str]:
+        """
+        Collects every ladder player's recent matches for one regional routing host
+
+        Returns:
+            Path of the region's raw match file, None when no new matches were found
+        """
+        client = TFTAPIClient(rate_limit_buffer=self.rate_limit_buffer, pool_size=max(10, max_workers),
+                              cache_path=None, index_path=None)
+        client.match_cache = self.match_cache
+        client.match_index = self.match_index
+        region_ids = []
+        for platform in TFTAPIClient.Regions[region]:
+            puuids = self.get_ladder_puuids(client, platform)
+            print(f"[{region}] {platform}: {len(puuids)} ladder players")
+            if not puuids:
+                continue
+            match_ids = client.get_match_ids(puuids, platform, count, start_time=start_time)
+            new_ids = self.match_ids.claim(sorted(match_ids))
+            self.match_index.mark(new_ids, SEEN, source='leagues')
+            print(f"[{region}] {platform}: {len(new_ids)} new matches of {len(match_ids)}")
+            region_ids.extend(new_ids)
+
+        if not region_ids:
+            return None
+        platform = TFTAPIClient.Regions[region][0]
+        name = f'{region}_{region_ids[0]}_{region_ids[-1]}_{len(region_ids)}'
+        return client.save_multi_match_data(region_ids, platform, max_workers=max_workers,
+                                            compression=compression, name=name)
+
+
+    def crawl(self, count: int = 5, max_workers: int = 1, compression: Optional[str] = None,
+              start_time: Optional[int] = None) -> Dict[str, Optional[str]]:
+        """
+        Crawls every region in parallel
+
+        Args:
+            count: Matches per player
+            max_workers: Concurrent match detail requests inside each region
+            compression: None, 'gz' or 'zst' for the raw match files
+            start_time: Epoch seconds, matches played before it are never fetched
+
+        Returns:
+            Raw match file per region
+        """
+        start = time.time()
+        outputs = {}
+        with METRICS.stage('crawl') as stage, ThreadPoolExecutor(max_workers=len(self.regions)) as executor:
+            futures = {
+                executor.submit(self.crawl_region, region, count, max_workers, compression, start_time): region
+                for region in self.regions
+            }
+            for future in as_completed(futures):
+                region = futures[future]
+                try:
+                    outputs[region] = future.result()
+                except Exception as e:
+                    print(f"[{region}] crawl failed: {e}")
+                    outputs[region] = None
+            stage.records = len(self.match_ids.seen)
+
+        print(f"Crawled {len(self.match_ids.seen)} unique matches across {len(self.regions)} regions "
+              f"in {time.time() - start:.1f}s")
+        return outputs
+
+
+def crawler_main(regions: Optional[List[str]] = None, tiers: Iterable[str] = TFTLadderCrawler.Tiers,
+                 count: int = 5, max_workers: int = 1, compression: Optional[str] = None):
+    crawler = TFTLadderCrawler(regions=regions, tiers=tiers)
+    return crawler.crawl(count=count, max_workers=max_workers, compression=compression)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TFT Ladder Crawler')
+    parser.add_argument('--regions', type=str, nargs='+', choices=list(TFTAPIClient.Regions), default=None,
+                        help='Regional routing values to crawl (default: all)')
+    parser.add_argument('--tiers', type=str, nargs='+', choices=list(TFTLadderCrawler.Tiers),
+                        default=list(TFTLadderCrawler.Tiers), help='Ladders to sweep (default: challenger grandmaster)')
+    parser.add_argument('--count', type=int, default=5,
+                        help='Matches per player (default: 5)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Concurrent match detail requests per region (default: 1)')
+    parser.add_argument('--compression', type=str, choices=['gz', 'zst'], default=None,
+                        help='Compress the raw match files (default: none)')
+    add_profiling_arguments(parser)
+
+    args = parser.parse_args()
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        crawler_main(regions=args.regions, tiers=args.tiers, count=args.count, max_workers=args.workers,
+                     compression=args.compression)
@@ -1,57 +1,83 @@
-import json
+import os
+import sys
 import argparse
 from datetime import datetime
-from typing import List, Dict, Optional
-from tft_leagues_match_data import data_collector_main
+from typing import List, Dict, Optional, Tuple, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_leagues_match_data import data_collector_main, stream_collector_main
+from tft_match_filter import MatchFilter, drop_empty_slots
+from tft_metrics import METRICS, add_profiling_arguments, profiled
+from tft_patches import PatchRegistry
 import pandas as pd
 
+
 class TFTDataCleaner:
 
-    def __init__(self, platform: str = 'na1', count: int = 5):
-        """Initialize Data Cleaner"""
-        self.file = data_collector_main(platform=platform, count=count)
+    def __init__(self, platform: str = 'na1', count: int = 5, max_workers: int = 1, incremental: bool = False,
+                 compression: Optional[str] = None, start_time: Optional[int] = None,
+                 file: Optional[Tuple[List[Dict], str]] = None):
+        """
+        Initialize Data Cleaner
+
+        Args:
+            file: Already parsed (records, name) to clean instead of collecting from the API
+        """
+        self.patches = PatchRegistry()
+        self.dataframe = None
+        if file is not None:
+            self.file = file
+            return
+        self.file = data_collector_main(platform=platform, count=count, max_workers=max_workers,
+                                        incremental=incremental, compression=compression, start_time=start_time)
         
 
-    def set_identifier(self, set_number: int = 16):
-        """Check for proper set number excludes any for fun gamemodes"""
-        data = []
-        for match in self.file[0]:
-            if match['tft_set_number'] != set_number:
-                del match
-            else:
-                data.append(match)
-        filename = self.file[1]
-        return data, filename
-
-
-    def set_time_check(self, match_data: List):
-        """Creates boundary for current patch time/date"""
-        data = []
-        # current_set_release = datetime(2025, 12, 9, 8, 15, 0) # patch 16.1b
-        current_set_release = datetime(2025, 12, 16, 11, 30, 0) # patch 16.1c
-        for match in match_data:
-            match_datetime = datetime.fromisoformat(match['game_datetime'])
-            if match_datetime < current_set_release:
-                del match
-            else:
-                data.append(match)
-        return data
+    def filter_matches(self, match_filter: MatchFilter):
+        """
+        Applies every filter to the collected records as one vectorized mask
+
+        The wide dataframe is prepared once with the columns the filter reads and masked
+        by MatchFilter.apply_frame. The passing rows are kept in self.dataframe, so the
+        output is saved without preparing the records again.
+        """
+        records, filename = self.file
+        self.dataframe = None
+        if not records or match_filter.columns is None:
+            # custom predicates without a frame form are checked per record
+            return match_filter.apply(records), filename
+        dataframe = match_filter.apply_frame(self.dataframe_prep(records, match_filter.columns))
+        extra = [col for col in match_filter.columns if col not in ('riotIdGameName', 'match_id', 'placement')]
+        self.dataframe = drop_empty_slots(dataframe.drop(columns=extra)).reset_index(drop=True)
+        return [records[i] for i in dataframe.index], filename
+
+
+    def set_identifier(self, set_number: Optional[int] = None):
+        """Check for proper set number excludes any for fun gamemodes, defaults to the latest registered set"""
+        if set_number is None:
+            set_number = self.patches.latest().set_number
+        return self.filter_matches(MatchFilter(set_number=set_number))
+
+
+    def set_time_check(self, match_data: List, patch: Optional[str] = None):
+        """Creates boundary for current patch time/date, defaults to the latest registered patch"""
+        current_patch = self.patches.get(patch) if patch else self.patches.latest()
+        return MatchFilter(released_after=current_patch.released).apply(match_data)
 
 
     def top_4(self, match_data: List):
-        data = []
-        for match in match_data:
-            placement = match['placement']
-            if placement > 4:
-                del match
-            else:
-                data.append(match)
+        return MatchFilter(placement_range=(1, 4)).apply(match_data)
 
-        return data
 
+    def dataframe_prep(self, match_data, columns: Optional[Dict[str, Callable[[Dict], object]]] = None):
+        """
+        Prepares the list data to be turned in a dataframe for future analysis
 
-    def dataframe_prep(self, match_data):
-        """Prepares the list data to be turned in a dataframe for future analysis"""
+        Args:
+            columns: Extra column name to record getter, e.g. MatchFilter.columns
+        """
         rows = []
         for record in match_data:
             row = {
@@ -74,26 +100,191 @@ class TFTDataCleaner:
                 row[f'trait_{i}_num_units'] = trait['num_units']
                 row[f'trait_{i}_tier'] = trait['tier']
             
+            if columns is not None:
+                for col, getter in columns.items():
+                    row[col] = getter(record)
             rows.append(row)
 
         df = pd.DataFrame(rows)
         return df
+
+
+    def normalized_tables(self, match_data) -> Dict[str, pd.DataFrame]:
+        """
+        Splits the records into long tables keyed by match_id + puuid
+
+        Returns:
+            boards: one row per player board
+            units: one row per unit, slot is the unit's position on the board
+            unit_items: one row per item held by a unit
+            traits: one row per active trait
+        """
+        boards = {col: [] for col in ('match_id', 'puuid', 'riotIdGameName', 'game_version', 'placement',
+                                      'level', 'gold_left', 'total_damage_to_players')}
+        units = {col: [] for col in ('match_id', 'puuid', 'slot', 'character_id', 'star_level', 'num_items')}
+        unit_items = {col: [] for col in ('match_id', 'puuid', 'slot', 'item_slot', 'item')}
+        traits = {col: [] for col in ('match_id', 'puuid', 'name', 'num_units', 'tier')}
+
+        for record in match_data:
+            match_id = record['match_id']
+            puuid = record['puuid']
+            for col in boards:
+                boards[col].append(record[col])
+
+            for slot, unit in enumerate(record['units'], 1):
+                units['match_id'].append(match_id)
+                units['puuid'].append(puuid)
+                units['slot'].append(slot)
+                units['character_id'].append(unit['character_id'])
+                units['star_level'].append(unit['star_level'])
+                units['num_items'].append(len(unit['items']))
+                for item_slot, item in enumerate(unit['items'], 1):
+                    unit_items['match_id'].append(match_id)
+                    unit_items['puuid'].append(puuid)
+                    unit_items['slot'].append(slot)
+                    unit_items['item_slot'].append(item_slot)
+                    unit_items['item'].append(item)
+
+            for trait in record['traits']:
+                traits['match_id'].append(match_id)
+                traits['puuid'].append(puuid)
+                traits['name'].append(trait['name'])
+                traits['num_units'].append(trait['num_units'])
+                traits['tier'].append(trait['tier'])
+
+        category_cols = ('match_id', 'puuid', 'riotIdGameName', 'game_version', 'character_id', 'item', 'name')
+        tables = {}
+        for table_name, columns in (('boards', boards), ('units', units), ('unit_items', unit_items), ('traits', traits)):
+            df = pd.DataFrame(columns)
+            for col in df.columns:
+                if col in category_cols:
+                    df[col] = df[col].astype('category')
+                elif col not in ('gold_left', 'total_damage_to_players'):
+                    df[col] = df[col].astype('int8')
+            tables[table_name] = df
+        return tables
+
+
+    def compact_dtypes(self, df):
+        """
+        Shrinks the dataframe for columnar storage
+
+        Unit, item and trait names become categoricals (dictionary encoded in Parquet/Arrow)
+        and placement, star level, trait counts and tiers become nullable int8.
+        """
+        df = df.copy()
+        for col in df.columns:
+            if col in ('riotIdGameName', 'match_id') or col.endswith(('_character_id', '_name')) or '_item_' in col:
+                df[col] = df[col].astype('category')
+            elif col == 'placement' or col.endswith(('_star_level', '_num_units', '_tier')):
+                df[col] = df[col].astype('Int8')
+        return df
+
+
+def save_dataframe(dataframe, name: str, output_format: str = 'csv') -> str:
+    """
+    Saves the cleaned dataframe as csv, parquet or arrow (Arrow IPC / Feather v2)
+
+    Returns:
+        Path of the written file
+    """
+    if output_format == 'csv':
+        path = 'tft_data/cleaned_csv/' + name + '.csv'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        dataframe.to_csv(path)
+        return path
+
+    path = f'tft_data/cleaned_{output_format}/{name}.{output_format}'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if output_format == 'parquet':
+        dataframe.to_parquet(path, index=False, compression='zstd')
+    elif output_format == 'arrow':
+        dataframe.reset_index(drop=True).to_feather(path, compression='zstd')
+    else:
+        raise ValueError(f"Unknown output format {output_format}")
+    print(f"Saving Cleaned Match Data to {path}")
+    return path
+
+
+def save_tables(tables: Dict[str, pd.DataFrame], name: str, output_format: str = 'csv') -> List[str]:
+    """Saves each normalized table to its own file under a folder named after the dataset"""
+    return [save_dataframe(df, f'{name}/{table_name}', output_format) for table_name, df in tables.items()]
       
 
-def main(platform: str, count: int):
-    cleaner = TFTDataCleaner(platform=platform, count=count)
-    set_id = cleaner.set_identifier()
-    # print(set_id[0])
-    set_time = cleaner.set_time_check(set_id[0])
-    # top_4_matches = cleaner.top_4(set_time)
+def write_output(cleaner: TFTDataCleaner, match_data: List, name: str, output_format: str = 'csv', layout: str = 'wide',
+                 dataframe: Optional[pd.DataFrame] = None):
+    """
+    Saves the cleaned records in the wide or long layout
+
+    Args:
+        dataframe: Wide dataframe of match_data already prepared by filter_matches
+    """
+    if not match_data:
+        # an incremental run with nothing new (or a filter keeping nothing) leaves no empty files behind
+        print(f"No records left to clean for {name}, nothing saved")
+        return
+    if layout == 'long':
+        with METRICS.stage('normalized_tables') as stage:
+            tables = cleaner.normalized_tables(match_data)
+            stage.records = len(match_data)
+        with METRICS.stage('save') as stage:
+            save_tables(tables, name, output_format)
+            stage.records = len(match_data)
+        return
+    with METRICS.stage('dataframe_prep') as stage:
+        if dataframe is None:
+            dataframe = cleaner.dataframe_prep(match_data)
+        if output_format != 'csv':
+            dataframe = cleaner.compact_dtypes(dataframe)
+        stage.records = len(dataframe)
+    with METRICS.stage('save') as stage:
+        save_dataframe(dataframe, name, output_format)
+        stage.records = len(dataframe)
+
+
+def patch_window(patches: PatchRegistry, patch: Optional[str] = None, split_patches: bool = False) -> Tuple[int, datetime]:
+    """
+    Set number and release cutoff to keep
+
+    Returns the chosen patch (default latest) and its release time, or with split_patches
+    the release of the set's first patch so every patch of the set is kept.
+    """
+    current_patch = patches.get(patch) if patch else patches.latest()
+    if split_patches:
+        release = min(p.released for p in patches.patches if p.set_number == current_patch.set_number)
+    else:
+        release = current_patch.released
+    return current_patch.set_number, release
+
+
+def main(platform: str, count: int, workers: int = 1, incremental: bool = False, compression: Optional[str] = None,
+         output_format: str = 'csv', layout: str = 'wide', patch: Optional[str] = None, split_patches: bool = False,
+         stream: bool = False):
+    patches = PatchRegistry()
+    # with split_patches keep the whole set and write one output per patch
+    set_number, release = patch_window(patches, patch, split_patches)
+    match_filter = MatchFilter(set_number=set_number, released_after=release)
+    if stream:
+        # constant memory: cleaned records are written as JSONL while matches arrive
+        stream_collector_main(platform=platform, count=count, max_workers=workers, compression=compression,
+                              start_time=int(release.timestamp()), record_filter=match_filter,
+                              output_dir='tft_data/cleaned_matches')
+        return
+    cleaner = TFTDataCleaner(platform=platform, count=count, max_workers=workers, incremental=incremental,
+                             compression=compression, start_time=int(release.timestamp()))
+    # match_filter = MatchFilter(set_number=set_number, released_after=release, placement_range=(1, 4)) # top 4
+    with METRICS.stage('filter') as stage:
+        set_id = cleaner.filter_matches(match_filter)
+        stage.records = len(cleaner.file[0])
     # cleaned_file_json = 'tft_data/cleaned_matches/' + set_id[1] + '.json'
     # print(f"Saving Cleaned Match Data to {cleaned_file_json}")
     # with open(cleaned_file_json, 'w') as f:
-    #     json.dump(top_4_matches, f, indent=2)
-    # dataframe = cleaner.dataframe_prep(top_4_matches)
-    dataframe = cleaner.dataframe_prep(set_time)
-    csv = 'tft_data/cleaned_csv/' + set_id[1] + '.csv'
-    dataframe.to_csv(csv)
+    #     json.dump(set_id[0], f, indent=2)
+    if split_patches:
+        for patch_name, records in patches.partition(set_id[0]).items():
+            write_output(cleaner, records, f'{set_id[1]}_{patch_name}', output_format, layout)
+    else:
+        write_output(cleaner, set_id[0], set_id[1], output_format, layout, dataframe=cleaner.dataframe)
 
 
 if __name__ == "__main__":
@@ -102,6 +293,26 @@ if __name__ == "__main__":
                         help='Platform (default: na1)')
     parser.add_argument('--count', type=int, default=5,
                         help='(default: count 5)')       
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Concurrent match detail requests (default: 1)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only collect matches played since the last incremental run')
+    parser.add_argument('--compression', type=str, choices=['gz', 'zst'], default=None,
+                        help='Compress the raw match file (default: none)')
+    parser.add_argument('--format', type=str, choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help='Cleaned output format (default: csv)')
+    parser.add_argument('--layout', type=str, choices=['wide', 'long'], default='wide',
+                        help='wide: one row per board with unit_i columns, long: boards/units/unit_items/traits tables (default: wide)')
+    parser.add_argument('--patch', type=str, default=None,
+                        help='Patch from tft_patches.json to keep, e.g. 16.1c (default: latest)')
+    parser.add_argument('--split-patches', action='store_true',
+                        help='Keep every patch of the set and write one output per patch')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream cleaned records to JSONL while matches arrive, using constant memory')
+    add_profiling_arguments(parser)
 
     args = parser.parse_args()
-    main(platform=args.platform, count=args.count)
\ No newline at end of file
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        main(platform=args.platform, count=args.count, workers=args.workers, incremental=args.incremental,
+             compression=args.compression, output_format=args.format, layout=args.layout,
+             patch=args.patch, split_patches=args.split_patches, stream=args.stream)
\ No newline at end of file
@@ -1,7 +1,72 @@
-import json
+import os
+import sys
+import argparse
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterable, Iterator, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
 from tft_leagues_api_client import TFTAPIClient
+from tft_leagues_collection_state import CollectionState
+from tft_codec import dumps
+from tft_match_index import SEEN, PARSED
+from tft_leagues_match_store import MatchWriter, read_matches
+from tft_metrics import METRICS, add_profiling_arguments, profiled
+
+
+def parse_matches(match_data: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Yields parsed participant records one match at a time
+
+    Needs no API client, so raw matches can be reparsed offline, see TFTDataCollector.parse_data
+    """
+    for match in match_data:
+        info = match['info']
+        metadata = match['metadata']
+        
+        for player in info['participants']:
+            units = []
+            for unit in player['units']:
+                units.append({
+                    'character_id': unit['character_id'],
+                    'star_level': unit['tier'],
+                    'items': unit.get('itemNames', [])
+                })
+            
+            traits = []
+            for trait in player['traits']:
+                if trait['tier_current'] > 0: 
+                    traits.append({
+                        'name': trait['name'],
+                        'num_units': trait['num_units'],
+                        'tier': trait['tier_current']
+                    })
+            
+            player_data = {
+                'match_id': metadata['match_id'],
+                'puuid': player['puuid'],
+                'riotIdGameName': player['riotIdGameName'],
+                'game_datetime': datetime.fromtimestamp(info['game_datetime'] / 1000).isoformat(),
+                'game_timestamp': info['game_datetime'],
+                'game_length': info['game_length'],
+                'game_version': info['game_version'],
+                'tft_set_number': info['tft_set_number'],
+                'queue_id': info['queue_id'],
+                'placement': player['placement'],
+                'level': player['level'],
+                'last_round': player['last_round'],
+                'players_eliminated': player['players_eliminated'],
+                'gold_left': player['gold_left'],
+                'time_eliminated': player['time_eliminated'],
+                'total_damage_to_players': player['total_damage_to_players'],
+                'units': units,
+                'traits': traits,
+                'companion': player.get('companion', {})
+            }
+            yield player_data
+
 
 class TFTDataCollector:
 
@@ -14,12 +79,24 @@ class TFTDataCollector:
         summoner = self.client.get_challenger_league(self.platform)
         return summoner
 
-    def collect_match_ids(self, puuid: str, count: int = 5) -> List[str]:
-        match_ids = self.client.get_match_ids(puuid, self.platform, count)
+    def collect_match_ids(self, puuid: str, count: int = 5, start_time: Optional[int] = None) -> List[str]:
+        match_ids = self.client.get_match_ids(puuid, self.platform, count, start_time=start_time)
         return match_ids
 
-    def collect_match_data(self, match_ids, collect_raw_data: bool = True):
-        match_data = self.client.get_multi_match_data(match_ids, self.platform)
+    def collect_new_match_ids(self, puuids: List[str], state: CollectionState, count: int = 5,
+                              start_time: Optional[int] = None) -> List[str]:
+        """Collects only match IDs that were played after, and not ingested by, previous runs"""
+        start_times = state.get_start_times(puuids)
+        match_ids = self.client.get_new_match_ids(puuids, self.platform, start_times, count,
+                                                  min_start_time=start_time)
+        new_ids = state.filter_new(match_ids)
+        print(f"{len(new_ids)} of {len(match_ids)} matches are new since the last run")
+        return new_ids
+
+    def collect_match_data(self, match_ids, collect_raw_data: bool = True, max_workers: int = 1,
+                           compression: Optional[str] = None):
+        match_data = self.client.get_multi_match_data(match_ids, self.platform, max_workers=max_workers,
+                                                      compression=compression)
         return match_data
 
     def parse_data(self, match_data):
@@ -32,60 +109,87 @@ class TFTDataCollector:
         Returns:
             data: List of parsed match data dictionaries 
         """
-        data = []
-        for match in match_data:
-            info = match['info']
-            metadata = match['metadata']
-            
-            for player in info['participants']:
-                units = []
-                for unit in player['units']:
-                    units.append({
-                        'character_id': unit['character_id'],
-                        'star_level': unit['tier'],
-                        'items': unit.get('itemNames', [])
-                    })
-                
-                traits = []
-                for trait in player['traits']:
-                    if trait['tier_current'] > 0: 
-                        traits.append({
-                            'name': trait['name'],
-                            'num_units': trait['num_units'],
-                            'tier': trait['tier_current']
-                        })
-                
-                player_data = {
-                    'match_id': metadata['match_id'],
-                    'riotIdGameName': player['riotIdGameName'],
-                    'game_datetime': datetime.fromtimestamp(info['game_datetime'] / 1000).isoformat(),
-                    'game_length': info['game_length'],
-                    'game_version': info['game_version'],
-                    'tft_set_number': info['tft_set_number'],
-                    'queue_id': info['queue_id'],
-                    'placement': player['placement'],
-                    'level': player['level'],
-                    'last_round': player['last_round'],
-                    'players_eliminated': player['players_eliminated'],
-                    'gold_left': player['gold_left'],
-                    'time_eliminated': player['time_eliminated'],
-                    'total_damage_to_players': player['total_damage_to_players'],
-                    'units': units,
-                    'traits': traits,
-                    'companion': player.get('companion', {})
-                }
-                data.append(player_data)        
-        return data
-
-def data_collector_main(platform: str = 'na1', count: int = 1):
-    """Main collector"""
+        return list(self.iter_parse_data(match_data))
+
+    def iter_parse_data(self, match_data: Iterable[Dict]) -> Iterator[Dict]:
+        """Yields parsed participant records one match at a time, see parse_data"""
+        return parse_matches(match_data)
+
+    def stream_records(self, match_ids: List[str], record_filter: Optional[Callable[[Dict], bool]] = None,
+                       max_workers: int = 1, compression: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Fetches, saves, parses and filters matches one at a time
+
+        Each raw match is appended to the raw match file as it arrives and its
+        participant records are yielded right away, so memory stays proportional to the
+        matches in flight. Matches already saved by an interrupted run are read back
+        from the raw file instead of being fetched again.
+
+        Args:
+            match_ids: List of match IDs
+            record_filter: Predicate a parsed record must pass to be yielded, e.g. a MatchFilter
+            max_workers: Concurrent match detail requests
+            compression: None, 'gz' or 'zst' for the raw match file
+        """
+        filepath = self.client.raw_match_path(match_ids, compression)
+        with MatchWriter(filepath) as writer:
+            saved = [match for match in match_ids if match in writer.written_ids]
+            pending = [match for match in match_ids if match not in writer.written_ids]
+            if saved:
+                print(f"Resuming {filepath}: {len(saved)} matches already saved")
+                for record in self.iter_parse_data(read_matches(filepath, typed=True)):
+                    if record_filter is None or record_filter(record):
+                        yield record
+
+            for match in self.client.iter_match_data(pending, self.platform, max_workers):
+                writer.write(match)
+                for record in self.iter_parse_data([match]):
+                    if record_filter is None or record_filter(record):
+                        yield record
+        print(f"Saved {writer.count} matches to {filepath}")
+
+def data_collector_main(platform: str = 'na1', count: int = 1, max_workers: int = 1, incremental: bool = False,
+                        compression: Optional[str] = None, start_time: Optional[int] = None):
+    """
+    Main collector
+
+    Args:
+        platform: Platform identifier (e.g., 'na1')
+        count: Matches per player, for incremental runs only used for players seen for the first time
+        max_workers: Concurrent match detail requests
+        incremental: Only collect matches newer than the previous incremental run
+        compression: None, 'gz' or 'zst' for the raw match file
+        start_time: Epoch seconds, matches played before it are never fetched
+    """
     collector = TFTDataCollector(platform)
     puuid = collector.get_puuids()
+    match_index = collector.client.match_index
+    state = CollectionState(match_index=match_index) if incremental else None
     # match_ids = collector.collect_match_ids(puuid[:9], count) # gm league
-    match_ids = collector.collect_match_ids(puuid, count) # challenger league
-    match_data = collector.collect_match_data(match_ids)
+    with METRICS.stage('collect_match_ids') as stage:
+        if incremental:
+            match_ids = collector.collect_new_match_ids(puuid, state, count, start_time)
+        else:
+            match_ids = collector.collect_match_ids(puuid, count, start_time) # challenger league
+        stage.records = len(match_ids)
+    if not match_ids:
+        # start_time drops every game played before the patch, so an empty sweep is a normal outcome
+        print("No new matches since the last run" if incremental else "No matches found")
+        return [], f"{platform}_{'no_new_matches' if incremental else 'no_matches'}"
+    if match_index is not None:
+        match_index.mark(match_ids, SEEN, source='leagues')
+    with METRICS.stage('collect_match_data') as stage:
+        match_data = collector.collect_match_data(match_ids, max_workers=max_workers, compression=compression)
+        stage.records = len(match_data)
+    if incremental:
+        fetched = {match['metadata']['match_id'] for match in match_data}
+        state.record_matches(match_data, unfetched_ids=[match_id for match_id in match_ids if match_id not in fetched])
     # print(match_data)
-    parsed_data = collector.parse_data(match_data)
+    with METRICS.stage('parse') as stage:
+        parsed_data = collector.parse_data(match_data)
+        stage.records = len(parsed_data)
+    if match_index is not None:
+        match_index.mark([match['metadata']['match_id'] for match in match_data], PARSED, source='leagues')
     filename = f'{match_ids[0]}_{match_ids[-1]}_{len(parsed_data)}'
     # parsed_file = 'tft_data/parsed_matches/' + filename + '.json'
     # print(f"Saving Parsed Match Data to {parsed_file}")
@@ -94,5 +198,46 @@ def data_collector_main(platform: str = 'na1', count: int = 1):
     return parsed_data, filename
 
 
+def stream_collector_main(platform: str = 'na1', count: int = 1, max_workers: int = 1,
+                          compression: Optional[str] = None, start_time: Optional[int] = None,
+                          record_filter: Optional[Callable[[Dict], bool]] = None,
+                          output_dir: str = 'tft_data/parsed_matches') -> Optional[str]:
+    """
+    Streaming collector, runs fetch -> parse -> filter -> write as a generator pipeline
+
+    Parsed records are written one per line to a JSONL file in output_dir as their
+    match arrives, so memory use does not grow with the size of the sweep.
+
+    Returns:
+        Path of the records file, None when no matches were found
+    """
+    collector = TFTDataCollector(platform)
+    puuid = collector.get_puuids()
+    match_ids = collector.collect_match_ids(puuid, count, start_time) # challenger league
+    if not match_ids:
+        print("No matches found")
+        return None
+    match_index = collector.client.match_index
+    if match_index is not None:
+        match_index.mark(match_ids, SEEN, source='leagues')
+
+    output_path = f'{output_dir}/{match_ids[0]}_{match_ids[-1]}_{len(match_ids)}.jsonl'
+    os.makedirs(output_dir, exist_ok=True)
+    written = 0
+    parsed_ids = set()
+    with open(output_path, 'w') as f, METRICS.stage('stream') as stage:
+        for record in collector.stream_records(match_ids, record_filter, max_workers, compression):
+            f.write(dumps(record) + '\n')
+            parsed_ids.add(record['match_id'])
+            written += 1
+        stage.records = written
+    if match_index is not None:
+        match_index.mark(parsed_ids, PARSED, source='leagues')
+    print(f"Saving {written} Parsed Records to {output_path}")
+    return output_path
+
+
 if __name__ == '__main__':
-    data_collector_main('na1')
\ No newline at end of file
+    args = add_profiling_arguments(argparse.ArgumentParser(description='TFT Data Collector')).parse_args()
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        data_collector_main('na1')
\ No newline at end of file
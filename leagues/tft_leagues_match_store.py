@@ -0,0 +1,136 @@
+import io
+import os
+import sys
+import gzip
+from typing import Dict, Iterator, Set
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_codec import MatchSchemaError, decode_match, dumps, loads
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Errors raised when a crash left a partial record or compressed block at the end of a file
+_TAIL_ERRORS = (EOFError, OSError, ValueError) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def _open_match_file(path: str, mode: str):
+    """Opens a .jsonl, .jsonl.gz or .jsonl.zst file in text mode ('r', 'w' or 'a')"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("zstandard is required for .zst match files (pip install zstandard)")
+        if mode == 'r':
+            reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+            return io.TextIOWrapper(reader, encoding='utf-8')
+        writer = zstandard.ZstdCompressor().stream_writer(open(path, mode + 'b'))
+        return io.TextIOWrapper(writer, encoding='utf-8', write_through=True)
+    return open(path, mode, encoding='utf-8')
+
+
+def read_matches(path: str, typed: bool = False) -> Iterator[Dict]:
+    """
+    Streams raw matches from a match file one at a time.
+
+    Reads .jsonl files written by MatchWriter (optionally .gz/.zst compressed) and
+    stops at a truncated last record left by a crash. Legacy .json files
+    holding a single list of matches are loaded whole.
+
+    Args:
+        path: Match file
+        typed: Decode each match through codec.decode_match, keeping only the fields
+            parse_data needs. Leave False when the matches are written back out.
+    """
+    if path.endswith('.json'):
+        with open(path, 'rb') as f:
+            yield from loads(f.read())
+        return
+
+    decode = decode_match if typed else loads
+    with _open_match_file(path, 'r') as f:
+        try:
+            for line in f:
+                if not line.endswith('\n'):
+                    break
+                yield decode(line)
+        except MatchSchemaError:
+            raise
+        except _TAIL_ERRORS:
+            print(f"Stopped reading {path} at a damaged record")
+
+
+class MatchWriter:
+    """
+    Appends raw matches to a JSONL file as they arrive, one match per line.
+
+    Each record is flushed as soon as it is written, so a crash loses at most the
+    record in flight. Reopening an existing file resumes it: damaged trailing data is
+    dropped and the match IDs already saved are exposed as written_ids.
+    """
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Output file, compressed when it ends in .gz or .zst
+        """
+        self.path = path
+        self.written_ids: Set[str] = set()
+        self.count = 0
+        self.file = None
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            self._recover()
+
+
+    def _recover(self):
+        """Collects saved match IDs and rewrites the file if its tail is damaged"""
+        damaged = False
+        try:
+            with _open_match_file(self.path, 'r') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        damaged = True
+                        break
+                    self.written_ids.add(loads(line)['metadata']['match_id'])
+        except _TAIL_ERRORS + (KeyError,):
+            damaged = True
+
+        if damaged:
+            print(f"Repairing damaged tail of {self.path}, keeping {len(self.written_ids)} matches")
+            tmp_path = os.path.join(os.path.dirname(self.path), 'tmp_' + os.path.basename(self.path))
+            with _open_match_file(tmp_path, 'w') as f:
+                for match in read_matches(self.path):
+                    f.write(dumps(match) + '\n')
+            os.replace(tmp_path, self.path)
+        self.count = len(self.written_ids)
+
+
+    def __enter__(self):
+        self.file = _open_match_file(self.path, 'a')
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+    def write(self, match_data: Dict):
+        if self.file is None:
+            self.__enter__()
+        self.file.write(dumps(match_data) + '\n')
+        self.file.flush()
+        self.written_ids.add(match_data['metadata']['match_id'])
+        self.count += 1
+
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_leagues_data_cleaning import TFTDataCleaner, patch_window, write_output
+from tft_leagues_match_data import parse_matches
+from tft_match_filter import MatchFilter
+from tft_leagues_match_store import read_matches
+from tft_metrics import METRICS, add_profiling_arguments, profiled
+from tft_patches import PatchRegistry
+
+RAW_EXTENSIONS = ('.jsonl.gz', '.jsonl.zst', '.jsonl', '.json')
+
+
+def raw_dataset_name(path: str) -> Optional[str]:
+    """Dataset name of a raw match file (its name without extension), None for other files"""
+    filename = os.path.basename(path)
+    if filename.startswith('tmp_'):
+        # half-written repair file left by a crash in MatchWriter
+        return None
+    for extension in RAW_EXTENSIONS:
+        if filename.endswith(extension):
+            return filename[:-len(extension)]
+    return None
+
+
+def find_raw_files(raw_dir: str = 'tft_data/raw_matches') -> List[str]:
+    """Raw match files in raw_dir, largest first so the longest jobs start early"""
+    paths = [os.path.join(raw_dir, filename) for filename in os.listdir(raw_dir)
+             if raw_dataset_name(filename) is not None]
+    return sorted(paths, key=os.path.getsize, reverse=True)
+
+
+def reprocess_file(path: str, set_number: Optional[int], released_after: Optional[datetime],
+                   output_format: str = 'csv', layout: str = 'wide', split_patches: bool = False) -> Tuple[int, int]:
+    """
+    Parses and cleans one raw match file, runs in a worker process
+
+    The filter is rebuilt here from plain arguments since MatchFilter predicates
+    cannot be pickled.
+
+    Returns:
+        Matches read and records written
+    """
+    match_filter = MatchFilter(set_number=set_number, released_after=released_after)
+    match_ids = set()
+    records = []
+    for record in parse_matches(read_matches(path, typed=True)):
+        match_ids.add(record['match_id'])
+        if match_filter(record):
+            records.append(record)
+
+    if records:
+        name = raw_dataset_name(path)
+        cleaner = TFTDataCleaner(file=(records, name))
+        if split_patches:
+            for patch_name, patch_records in cleaner.patches.partition(records).items():
+                write_output(cleaner, patch_records, f'{name}_{patch_name}', output_format, layout)
+        else:
+            write_output(cleaner, records, name, output_format, layout)
+    return len(match_ids), len(records)
+
+
+def reprocess_main(raw_dir: str = 'tft_data/raw_matches', output_format: str = 'csv', layout: str = 'wide',
+                   patch: Optional[str] = None, split_patches: bool = False,
+                   workers: Optional[int] = None) -> Dict[str, Tuple[int, int]]:
+    """
+    Rebuilds the cleaned output of every raw match file without touching the API
+
+    Each raw file is one job for a process pool, so parsing and cleaning run on
+    every CPU core and each output keeps the name of its raw file.
+
+    Args:
+        raw_dir: Folder of raw match files written by the collectors
+        output_format: csv, parquet or arrow
+        layout: wide or long, see TFTDataCleaner.normalized_tables
+        patch: Patch from tft_patches.json to keep, defaults to the latest
+        split_patches: Keep every patch of the set and write one output per patch
+        workers: Worker processes, defaults to the number of CPUs
+
+    Returns:
+        (matches read, records written) per raw file, failed files are left out
+    """
+    start = time.time()
+    set_number, release = patch_window(PatchRegistry(), patch, split_patches)
+    paths = find_raw_files(raw_dir)
+    print(f"Reprocessing {len(paths)} raw match files from {raw_dir}")
+
+    results = {}
+    # stages inside the worker processes are not recorded, the parent times the whole pool
+    with METRICS.stage('reprocess') as stage, ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(reprocess_file, path, set_number, release, output_format, layout, split_patches): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                print(f"Failed to reprocess {path}: {e}")
+                continue
+            print(f"{path}: {results[path][1]} records kept from {results[path][0]} matches")
+            stage.records += results[path][1]
+
+    matches = sum(result[0] for result in results.values())
+    records = sum(result[1] for result in results.values())
+    print(f"Reprocessed {matches} matches into {records} records from {len(results)} files "
+          f"in {time.time() - start:.1f}s")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TFT Offline Reprocessing')
+    parser.add_argument('--raw-dir', type=str, default='tft_data/raw_matches',
+                        help='Folder of raw match files (default: tft_data/raw_matches)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: number of CPUs)')
+    parser.add_argument('--format', type=str, choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help='Cleaned output format (default: csv)')
+    parser.add_argument('--layout', type=str, choices=['wide', 'long'], default='wide',
+                        help='wide: one row per board with unit_i columns, long: boards/units/unit_items/traits tables (default: wide)')
+    parser.add_argument('--patch', type=str, default=None,
+                        help='Patch from tft_patches.json to keep, e.g. 16.1c (default: latest)')
+    parser.add_argument('--split-patches', action='store_true',
+                        help='Keep every patch of the set and write one output per patch')
+    add_profiling_arguments(parser)
+
+    args = parser.parse_args()
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        reprocess_main(raw_dir=args.raw_dir, output_format=args.format, layout=args.layout, patch=args.patch,
+                       split_patches=args.split_patches, workers=args.workers)
@@ -0,0 +1,331 @@
+import os
+import sys
+import sqlite3
+import argparse
+import itertools
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from tft_leagues_match_data import parse_matches
+from tft_leagues_match_store import read_matches
+from tft_match_filter import game_timestamp
+from tft_metrics import METRICS, add_profiling_arguments, profiled
+from tft_patches import PatchRegistry
+
+CHAMPION = 'champion'
+ITEM = 'item'
+CHAMPION_ITEM = 'champion_item'
+CHAMPION_ITEM_COUNT = 'champion_item_count'
+TRAIT = 'trait'
+
+KINDS = (CHAMPION, ITEM, CHAMPION_ITEM, CHAMPION_ITEM_COUNT, TRAIT)
+SORTS = {
+    'count': 'count DESC',
+    'avg_placement': 'avg_placement ASC',
+    'top4_rate': 'top4_rate DESC',
+}
+DEFAULT_FOLDERS = ('tft_data/raw_matches',)
+# cleaned outputs only keep the boards that passed a filter (e.g. top 4), indexing them skews the rates
+FILTERED_FOLDERS = ('cleaned_matches',)
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    """
+    Streams parsed records from a parsed output file (.json list or .jsonl records)
+
+    Raw match files are told apart by their match metadata and parsed on the fly.
+    """
+    items = iter(read_matches(path))
+    first = next(items, None)
+    if first is None:
+        return
+    items = itertools.chain([first], items)
+    if 'metadata' in first:
+        yield from parse_matches(items)
+    else:
+        yield from items
+
+
+class StatsIndex:
+    """
+    Incrementally maintained aggregate statistics of parsed boards.
+
+    Keeps count, placement sum and top-4 count per patch for every champion, item,
+    champion x item, champion x number of items and trait x tier. Boards are keyed
+    by match_id + puuid and counted once however many files contain them, and
+    whole files are skipped once ingested, so the index can be updated after every
+    collection run and queried without rescanning any data. Records without a puuid
+    (older parsed files) are skipped, their player names are not unique within a match.
+
+    Keys are champion ids, item names, 'champion|item', 'champion|n_items' and
+    'trait:tier'. Units and items are counted per copy on a board.
+    """
+    def __init__(self, path: str = 'tft_data/stats_index.sqlite'):
+        self.path = path
+        self.patches = PatchRegistry()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS stats ('
+            'patch TEXT NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL, '
+            'count INTEGER NOT NULL, placement_sum INTEGER NOT NULL, top4 INTEGER NOT NULL, '
+            'PRIMARY KEY (patch, kind, key))'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS boards ('
+            'match_id TEXT NOT NULL, player TEXT NOT NULL, PRIMARY KEY (match_id, player))'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS sources ('
+            'path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, '
+            'boards INTEGER NOT NULL, ingested REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+
+    def add_records(self, records: Iterable[Dict]) -> int:
+        """
+        Adds parsed participant records (parse_data output) to the index
+
+        Returns:
+            Boards added, records of boards already in the index or without a puuid are skipped
+        """
+        totals = {}
+        added = 0
+        with self._lock:
+            for record in records:
+                player = record.get('puuid')
+                if player is None:
+                    METRICS.inc('stats_index_no_puuid')
+                    continue
+                inserted = self.conn.execute(
+                    'INSERT OR IGNORE INTO boards (match_id, player) VALUES (?, ?)', (record['match_id'], player)
+                ).rowcount
+                if not inserted:
+                    continue
+                added += 1
+                self._count_board(record, totals)
+
+            self.conn.executemany(
+                'INSERT INTO stats (patch, kind, key, count, placement_sum, top4) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(patch, kind, key) DO UPDATE SET count = count + excluded.count, '
+                'placement_sum = placement_sum + excluded.placement_sum, top4 = top4 + excluded.top4',
+                [(*key, *values) for key, values in totals.items()]
+            )
+            self.conn.commit()
+        return added
+
+
+    def _count_board(self, record: Dict, totals: Dict):
+        patch = self.patches.patch_for(record['game_version'], game_timestamp(record))
+        placement = record['placement']
+        top4 = 1 if placement <= 4 else 0
+
+        def add(kind, key):
+            values = totals.get((patch, kind, key))
+            if values is None:
+                totals[(patch, kind, key)] = [1, placement, top4]
+            else:
+                values[0] += 1
+                values[1] += placement
+                values[2] += top4
+
+        for unit in record['units']:
+            champion = unit['character_id']
+            add(CHAMPION, champion)
+            add(CHAMPION_ITEM_COUNT, f"{champion}|{len(unit['items'])}")
+            for item in unit['items']:
+                add(ITEM, item)
+                add(CHAMPION_ITEM, f'{champion}|{item}')
+        for trait in record['traits']:
+            add(TRAIT, f"{trait['name']}:{trait['tier']}")
+
+
+    def add_file(self, path: str, force: bool = False) -> int:
+        """
+        Adds a parsed output file (.json list or .jsonl records) or a raw match file
+
+        Raw match files (tft_data/raw_matches) are recognised by their match metadata
+        and parsed on the fly. Files in a cleaned output folder are filtered subsets and
+        are skipped. A file already ingested with the same size and modification time is
+        skipped unless force.
+
+        Returns:
+            Boards added
+        """
+        if os.path.basename(os.path.dirname(os.path.abspath(path))) in FILTERED_FOLDERS:
+            print(f"Skipping {path}, cleaned outputs are filtered and would skew the stats")
+            return 0
+        stat = os.stat(path)
+        with self._lock:
+            row = self.conn.execute('SELECT size, mtime FROM sources WHERE path = ?', (path,)).fetchone()
+        if row is not None and tuple(row) == (stat.st_size, stat.st_mtime) and not force:
+            return 0
+
+        added = 0
+        batch = []
+        for record in read_records(path):
+            batch.append(record)
+            if len(batch) >= 10000:
+                added += self.add_records(batch)
+                batch = []
+        added += self.add_records(batch)
+
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO sources (path, size, mtime, boards, ingested) VALUES (?, ?, ?, ?, ?)',
+                (path, stat.st_size, stat.st_mtime, added, datetime.now().timestamp())
+            )
+            self.conn.commit()
+        return added
+
+
+    def update(self, folders: Iterable[str] = DEFAULT_FOLDERS) -> int:
+        """Adds every new or changed parsed or raw match file in the given folders"""
+        added = 0
+        for folder in folders:
+            if not os.path.isdir(folder):
+                continue
+            if os.path.basename(os.path.abspath(folder)) in FILTERED_FOLDERS:
+                print(f"Skipping {folder}, cleaned outputs are filtered and would skew the stats")
+                continue
+            for filename in sorted(os.listdir(folder)):
+                if filename.endswith(('.json', '.jsonl', '.jsonl.gz', '.jsonl.zst')) and not filename.startswith('tmp_'):
+                    added += self.add_file(os.path.join(folder, filename))
+        return added
+
+
+    def query(self, kind: str, patch: Optional[str] = None, prefix: Optional[str] = None, suffix: Optional[str] = None,
+              sort: str = 'count', limit: Optional[int] = 20, min_count: int = 1) -> List[Dict]:
+        """
+        Aggregated rows of one kind, summed over every patch unless one is given
+
+        Args:
+            kind: champion, item, champion_item, champion_item_count or trait
+            patch: Patch name to slice by, e.g. 16.1c
+            prefix: Keep keys starting with this, e.g. 'TFT16_Ahri|' for one champion's items
+            suffix: Keep keys ending with this, e.g. '|3' for champions holding 3 items
+            sort: count, avg_placement or top4_rate
+            limit: Rows to return, None for all
+            min_count: Leave out rows seen fewer times than this
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind {kind}")
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort {sort}")
+        sql = ('SELECT key, SUM(count) AS count, CAST(SUM(placement_sum) AS REAL) / SUM(count) AS avg_placement, '
+               'CAST(SUM(top4) AS REAL) / SUM(count) AS top4_rate FROM stats WHERE kind = ?')
+        params = [kind]
+        if patch is not None:
+            sql += ' AND patch = ?'
+            params.append(patch)
+        if prefix is not None:
+            sql += " AND substr(key, 1, length(?)) = ?"
+            params.extend([prefix, prefix])
+        if suffix is not None:
+            sql += " AND substr(key, -length(?)) = ?"
+            params.extend([suffix, suffix])
+        sql += f' GROUP BY key HAVING SUM(count) >= ? ORDER BY {SORTS[sort]}, key'
+        params.append(min_count)
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [{'key': key, 'count': count, 'avg_placement': avg, 'top4_rate': top4} for key, count, avg, top4 in rows]
+
+
+    def item_carriers(self, item: str, patch: Optional[str] = None, **kwargs) -> List[Dict]:
+        """Champions holding an item, e.g. TFT_Item_SpearOfShojin"""
+        rows = self.query(CHAMPION_ITEM, patch, suffix=f'|{item}', **kwargs)
+        return [dict(row, key=row['key'].split('|')[0]) for row in rows]
+
+
+    def champion_items(self, champion: str, patch: Optional[str] = None, **kwargs) -> List[Dict]:
+        """Items held by a champion"""
+        rows = self.query(CHAMPION_ITEM, patch, prefix=f'{champion}|', **kwargs)
+        return [dict(row, key=row['key'].split('|', 1)[1]) for row in rows]
+
+
+    def champions_with_items(self, n_items: int = 3, patch: Optional[str] = None, **kwargs) -> List[Dict]:
+        """Champions holding exactly n_items items"""
+        rows = self.query(CHAMPION_ITEM_COUNT, patch, suffix=f'|{n_items}', **kwargs)
+        return [dict(row, key=row['key'].split('|')[0]) for row in rows]
+
+
+    def patch_names(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute('SELECT DISTINCT patch FROM stats ORDER BY patch')]
+
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def print_rows(rows: List[Dict]):
+    for row in rows:
+        print(f"{row['key']:<50} {row['count']:>8}  avg {row['avg_placement']:.2f}  top4 {row['top4_rate']:.1%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TFT Stats Index')
+    parser.add_argument('--index', type=str, default='tft_data/stats_index.sqlite',
+                        help='Index database (default: tft_data/stats_index.sqlite)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    update_parser = subparsers.add_parser('update', help='Add new parsed or raw match files to the index')
+    update_parser.add_argument('paths', type=str, nargs='*',
+                               help='Files or folders (default: tft_data/raw_matches)')
+
+    for command in ('champions', 'items', 'traits', 'carriers', 'builds', 'full-items'):
+        command_parser = subparsers.add_parser(command)
+        if command == 'carriers':
+            command_parser.add_argument('item', type=str, help='Item, e.g. TFT_Item_SpearOfShojin')
+        elif command == 'builds':
+            command_parser.add_argument('champion', type=str, help='Champion, e.g. TFT16_Ahri')
+        elif command == 'full-items':
+            command_parser.add_argument('--items', type=int, default=3, help='Items held (default: 3)')
+        command_parser.add_argument('--patch', type=str, default=None, help='Patch to slice by (default: all)')
+        command_parser.add_argument('--sort', type=str, choices=list(SORTS), default='count',
+                                    help='Order of the rows (default: count)')
+        command_parser.add_argument('--limit', type=int, default=20, help='Rows to show (default: 20)')
+        command_parser.add_argument('--min-count', type=int, default=1,
+                                    help='Leave out rows seen fewer times (default: 1)')
+
+    subparsers.add_parser('patches', help='List the patches in the index')
+    add_profiling_arguments(parser)
+
+    args = parser.parse_args()
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        index = StatsIndex(args.index)
+        if args.command == 'update':
+            paths = args.paths or list(DEFAULT_FOLDERS)
+            with METRICS.stage('index_update') as stage:
+                stage.records = sum(index.add_file(path) if os.path.isfile(path) else index.update([path])
+                                    for path in paths)
+            print(f"Added {stage.records} boards to {args.index}")
+        elif args.command == 'patches':
+            print('\n'.join(index.patch_names()))
+        else:
+            options = {'sort': args.sort, 'limit': args.limit, 'min_count': args.min_count}
+            if args.command == 'carriers':
+                rows = index.item_carriers(args.item, args.patch, **options)
+            elif args.command == 'builds':
+                rows = index.champion_items(args.champion, args.patch, **options)
+            elif args.command == 'full-items':
+                rows = index.champions_with_items(args.items, args.patch, **options)
+            else:
+                kind = {'champions': CHAMPION, 'items': ITEM, 'traits': TRAIT}[args.command]
+                rows = index.query(kind, args.patch, **options)
+            print_rows(rows)
+        index.close()
@@ -0,0 +1,111 @@
+import json
+from typing import Any, Dict, List, TypedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def loads(data) -> Any:
+    """Decodes JSON from bytes or str, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Encodes compact UTF-8 JSON, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Encodes compact JSON (or 2-space indented), using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode('utf-8')
+    if indent:
+        return json.dumps(obj, indent=2)
+    return json.dumps(obj, separators=(',', ':'))
+
+
+class MatchSchemaError(ValueError):
+    """Raised when a match payload no longer matches the fields parse_data relies on"""
+
+
+class _UnitFields(TypedDict):
+    character_id: str
+    tier: int
+
+
+class Unit(_UnitFields, total=False):
+    itemNames: List[str]
+
+
+class Trait(TypedDict):
+    name: str
+    num_units: int
+    tier_current: int
+
+
+class _ParticipantFields(TypedDict):
+    puuid: str
+    riotIdGameName: str
+    placement: int
+    level: int
+    last_round: int
+    players_eliminated: int
+    gold_left: int
+    time_eliminated: float
+    total_damage_to_players: int
+    units: List[Unit]
+    traits: List[Trait]
+
+
+class Participant(_ParticipantFields, total=False):
+    companion: Dict[str, Any]
+
+
+class Info(TypedDict):
+    game_datetime: int
+    game_length: float
+    game_version: str
+    tft_set_number: int
+    queue_id: int
+    participants: List[Participant]
+
+
+class Metadata(TypedDict):
+    match_id: str
+    participants: List[str]
+
+
+class Match(TypedDict):
+    """The parts of a match-v1 payload that parse_data reads"""
+    metadata: Metadata
+    info: Info
+
+
+_match_decoder = msgspec.json.Decoder(Match) if msgspec is not None else None
+
+
+def decode_match(data) -> Dict:
+    """
+    Decodes a raw match payload keeping only the fields parse_data needs
+
+    With msgspec installed the payload is decoded against the Match schema, so every
+    other field is skipped and missing or mistyped fields raise MatchSchemaError up
+    front. Without it the full payload is decoded.
+    """
+    if msgspec is None:
+        return loads(data)
+    try:
+        return _match_decoder.decode(data)
+    except msgspec.DecodeError as e:
+        raise MatchSchemaError(f"Match payload does not match the expected schema: {e}") from e
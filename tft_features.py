@@ -0,0 +1,343 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+UNIT_COLUMN = re.compile(r'^unit_(\d+)_character_id$')
+ITEM_COLUMN = re.compile(r'^unit_\d+_item_\d+$')
+TRAIT_COLUMN = re.compile(r'^trait_(\d+)_name$')
+
+TOKEN_KINDS = ('unit', 'star', 'item', 'trait')
+
+# bumped whenever the cached feature files change shape
+CACHE_VERSION = 3
+
+
+def is_model_column(col):
+    """
+    Columns the board features use: placement and match_id, each unit's champion, star
+    level and items, each trait's name and tier
+    """
+    return (col in ('placement', 'match_id') or col.endswith(('_character_id', '_star_level', '_tier'))
+            or (col.startswith('trait_') and col.endswith('_name')) or '_item_' in col)
+
+
+def load_dataset(path, column_filter=None):
+    """
+    Loads a cleaned dataset from csv, parquet or arrow, reading only the columns
+    accepted by column_filter when one is given
+    """
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        columns = pq.read_schema(path).names
+        if column_filter is not None:
+            columns = [col for col in columns if column_filter(col)]
+        return pd.read_parquet(path, columns=columns)
+    if path.endswith(('.arrow', '.feather')):
+        import pyarrow.feather as feather
+        table = feather.read_table(path, memory_map=True)
+        if column_filter is not None:
+            table = table.select([col for col in table.column_names if column_filter(col)])
+        return table.to_pandas()
+    if column_filter is None:
+        return pd.read_csv(path, index_col=0)
+    df = pd.read_csv(path, index_col=0, usecols=lambda col: col == 'Unnamed: 0' or column_filter(col))
+    return df
+
+
+def record_tokens(record, kinds=TOKEN_KINDS):
+    """
+    Tokens of one parsed board (parse_data record), independent of unit order
+
+    unit:<champion> per unit, unit:<champion>:<star level> per unit, item:<item> per
+    held item and trait:<trait>:<tier> per active trait.
+    """
+    tokens = []
+    for unit in record['units']:
+        if 'unit' in kinds:
+            tokens.append(f"unit:{unit['character_id']}")
+        if 'star' in kinds:
+            tokens.append(f"unit:{unit['character_id']}:{unit['star_level']}")
+        if 'item' in kinds:
+            tokens.extend(f'item:{item}' for item in unit['items'][:3])
+    if 'trait' in kinds:
+        tokens.extend(f"trait:{trait['name']}:{trait['tier']}" for trait in record['traits'])
+    return tokens
+
+
+def _frame_groups(df, kinds=TOKEN_KINDS):
+    """
+    Yields the tokens of a wide cleaned dataframe one source column at a time
+
+    Token strings are built once per distinct value rather than once per row, each
+    group is (row positions, index into labels, labels).
+    """
+    positions = np.arange(len(df))
+
+    def group(prefix, *columns):
+        present = np.logical_and.reduce([col.notna().to_numpy() for col in columns])
+        codes, uniques = pd.factorize(columns[0][present])
+        if len(columns) == 1:
+            labels = [f'{prefix}{value}' for value in uniques]
+        else:
+            level_codes, levels = pd.factorize(columns[1][present].astype('int64'))
+            codes, combined = pd.factorize(codes * len(levels) + level_codes)
+            labels = [f'{prefix}{uniques[code // len(levels)]}:{levels[code % len(levels)]}' for code in combined]
+        return positions[present], codes, labels
+
+    for col in df.columns:
+        if UNIT_COLUMN.match(col):
+            star_col = col.replace('_character_id', '_star_level')
+            if 'unit' in kinds:
+                yield group('unit:', df[col])
+            if 'star' in kinds and star_col in df.columns:
+                yield group('unit:', df[col], df[star_col])
+        elif ITEM_COLUMN.match(col) and 'item' in kinds:
+            yield group('item:', df[col])
+        elif TRAIT_COLUMN.match(col) and 'trait' in kinds:
+            tier_col = col.replace('_name', '_tier')
+            if tier_col in df.columns:
+                yield group('trait:', df[col], df[tier_col])
+
+
+def frame_tokens(df, kinds=TOKEN_KINDS):
+    """
+    Tokens of every board in a wide cleaned dataframe (dataframe_prep layout)
+
+    Returns:
+        rows: Row position of each token
+        tokens: Token strings, the same ones record_tokens gives for the board
+    """
+    rows, tokens = [], []
+    for group_rows, codes, labels in _frame_groups(df, kinds):
+        rows.append(group_rows)
+        tokens.append(np.asarray(labels, dtype=object)[codes])
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=object)
+    return np.concatenate(rows), np.concatenate(tokens)
+
+
+class BoardVectorizer:
+    """
+    Sparse bag-of-board features for the placement model
+
+    Each board becomes one CSR row counting its champions, champion star levels,
+    items and active traits, so a champion is the same feature in whichever unit
+    slot it sits. The vocabulary is fitted once and saved as JSON so later runs
+    and scoring produce the same columns, tokens unseen at fit time are ignored.
+    """
+    def __init__(self, min_count: int = 1, kinds=TOKEN_KINDS, vocabulary=None):
+        """
+        Args:
+            min_count: Boards a token must appear in to get a column
+            kinds: Token kinds to use, any of 'unit', 'star', 'item' and 'trait'
+            vocabulary: Already fitted token to column mapping
+        """
+        self.min_count = min_count
+        self.kinds = tuple(kinds)
+        self.vocabulary = vocabulary
+
+
+    def fit(self, df):
+        token_ids = {}
+        rows, ids = [], []
+        for group_rows, codes, labels in _frame_groups(df, self.kinds):
+            label_ids = np.array([token_ids.setdefault(label, len(token_ids)) for label in labels], dtype=np.int64)
+            rows.append(group_rows)
+            ids.append(label_ids[codes])
+        tokens = list(token_ids)
+        if rows:
+            # every group is one source column, so copies of a token on a board (two
+            # units of one champion, a doubled item) sit in different groups and are
+            # only deduplicated here, a token counts once per board
+            pairs = np.unique(np.concatenate(rows) * max(1, len(tokens)) + np.concatenate(ids))
+            board_counts = np.bincount(pairs % max(1, len(tokens)), minlength=len(tokens))
+        else:
+            board_counts = np.zeros(0, dtype=np.int64)
+        kept = sorted(token for token, count in zip(tokens, board_counts) if count >= self.min_count)
+        self.vocabulary = {token: i for i, token in enumerate(kept)}
+        return self
+
+
+    def transform(self, df) -> sparse.csr_matrix:
+        self._check_fitted()
+        rows, columns = [], []
+        for group_rows, codes, labels in _frame_groups(df, self.kinds):
+            label_columns = np.array([self.vocabulary.get(label, -1) for label in labels], dtype=np.int64)
+            group_columns = label_columns[codes]
+            known = group_columns >= 0
+            rows.append(group_rows[known])
+            columns.append(group_columns[known])
+        if not rows:
+            return self._matrix(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), len(df))
+        return self._matrix(np.concatenate(rows), np.concatenate(columns), len(df))
+
+
+    def fit_transform(self, df) -> sparse.csr_matrix:
+        return self.fit(df).transform(df)
+
+
+    def transform_records(self, records) -> sparse.csr_matrix:
+        """Vectorizes parsed participant records straight from parse_data"""
+        self._check_fitted()
+        records = list(records)
+        rows, columns = [], []
+        for row, record in enumerate(records):
+            for token in record_tokens(record, self.kinds):
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+        return self._matrix(np.asarray(rows, dtype=np.int64), np.asarray(columns, dtype=np.int64), len(records))
+
+
+    def _check_fitted(self):
+        if self.vocabulary is None:
+            raise ValueError("BoardVectorizer must be fitted or loaded before transform")
+
+
+    def _matrix(self, rows, columns, n_rows) -> sparse.csr_matrix:
+        matrix = sparse.coo_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+            shape=(n_rows, len(self.vocabulary))
+        )
+        # duplicate (row, column) pairs are summed into counts
+        return matrix.tocsr()
+
+
+    @property
+    def feature_names(self):
+        return sorted(self.vocabulary, key=self.vocabulary.get)
+
+
+    def save(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'min_count': self.min_count, 'kinds': list(self.kinds),
+                       'features': self.feature_names}, f, indent=2)
+
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        vocabulary = {token: i for i, token in enumerate(saved['features'])}
+        return cls(min_count=saved['min_count'], kinds=saved['kinds'], vocabulary=vocabulary)
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's contents, read in 1MB chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeaturePipeline:
+    """
+    Fit/transform from a cleaned dataset file to the model's sparse matrix, cached on disk
+
+    The fitted vocabulary, feature matrix, placements and match groups are stored under cache_dir,
+    keyed by the SHA-256 of the input file and the vectorizer settings. Running an
+    experiment again on the same file, or scoring a file that was already
+    transformed with the same vocabulary, loads the cached matrix instead of
+    re-reading and re-encoding the data.
+    """
+    def __init__(self, cache_dir: str = 'tft_data/feature_cache', min_count: int = 5, kinds=TOKEN_KINDS,
+                 vectorizer: Optional[BoardVectorizer] = None):
+        """
+        Args:
+            cache_dir: Folder of cached matrices, one subfolder per key
+            min_count: Boards a token must appear in to get a column
+            kinds: Token kinds to use, see BoardVectorizer
+            vectorizer: Already fitted vectorizer, e.g. BoardVectorizer.load of a saved vocabulary
+        """
+        self.cache_dir = cache_dir
+        self.min_count = min_count
+        self.kinds = tuple(kinds)
+        self.vectorizer = vectorizer
+        # match of each row as an integer code, rows of one lobby share a code
+        self.groups: Optional[np.ndarray] = None
+
+
+    def fit_transform(self, path: str) -> Tuple[sparse.csr_matrix, pd.Series]:
+        """Fits the vocabulary on a dataset file and returns its feature matrix and placements"""
+        settings = json.dumps({'min_count': self.min_count, 'kinds': list(self.kinds), 'version': CACHE_VERSION})
+        key = hashlib.sha256((file_digest(path) + settings).encode('utf-8')).hexdigest()[:24]
+        cached = self._load(key, with_vocabulary=True)
+        if cached is not None:
+            return cached
+
+        df = load_dataset(path, column_filter=is_model_column)
+        self.vectorizer = BoardVectorizer(min_count=self.min_count, kinds=self.kinds).fit(df)
+        X, y = self.vectorizer.transform(df), df['placement']
+        self.groups = self._match_groups(df)
+        self._save(key, X, y, with_vocabulary=True)
+        return X, y
+
+
+    def transform(self, path: str) -> Tuple[sparse.csr_matrix, Optional[pd.Series]]:
+        """Encodes a dataset file with the fitted vocabulary, placements are None for unplayed boards"""
+        if self.vectorizer is None:
+            raise ValueError("FeaturePipeline must be fitted or given a vectorizer before transform")
+        vocabulary = '\n'.join(self.vectorizer.feature_names) + json.dumps([list(self.vectorizer.kinds), CACHE_VERSION])
+        key = hashlib.sha256((file_digest(path) + vocabulary).encode('utf-8')).hexdigest()[:24]
+        cached = self._load(key)
+        if cached is not None:
+            return cached
+
+        df = load_dataset(path, column_filter=is_model_column)
+        X = self.vectorizer.transform(df)
+        y = df['placement'] if 'placement' in df.columns else None
+        self.groups = self._match_groups(df)
+        self._save(key, X, y)
+        return X, y
+
+
+    @staticmethod
+    def _match_groups(df) -> Optional[np.ndarray]:
+        if 'match_id' not in df.columns:
+            return None
+        return pd.factorize(df['match_id'])[0]
+
+
+    def _load(self, key: str, with_vocabulary: bool = False):
+        folder = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(folder):
+            return None
+        if with_vocabulary:
+            self.vectorizer = BoardVectorizer.load(os.path.join(folder, 'vocabulary.json'))
+        X = sparse.load_npz(os.path.join(folder, 'X.npz'))
+        y_path = os.path.join(folder, 'y.npy')
+        y = pd.Series(np.load(y_path), name='placement') if os.path.exists(y_path) else None
+        groups_path = os.path.join(folder, 'groups.npy')
+        self.groups = np.load(groups_path) if os.path.exists(groups_path) else None
+        print(f"Loaded cached features from {folder}")
+        return X, y
+
+
+    def _save(self, key: str, X: sparse.csr_matrix, y: Optional[pd.Series], with_vocabulary: bool = False):
+        """Writes the cache entry to a temporary folder first so a crash never leaves a partial entry"""
+        folder = os.path.join(self.cache_dir, key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_folder = tempfile.mkdtemp(prefix='tmp_', dir=self.cache_dir)
+        if with_vocabulary:
+            self.vectorizer.save(os.path.join(tmp_folder, 'vocabulary.json'))
+        sparse.save_npz(os.path.join(tmp_folder, 'X.npz'), X)
+        if y is not None:
+            np.save(os.path.join(tmp_folder, 'y.npy'), y.to_numpy())
+        if self.groups is not None:
+            np.save(os.path.join(tmp_folder, 'groups.npy'), self.groups)
+        try:
+            os.replace(tmp_folder, folder)
+        except OSError:
+            # another run cached the same key first
+            shutil.rmtree(tmp_folder, ignore_errors=True)
@@ -0,0 +1,138 @@
+import time
+import random
+import threading
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from tft_codec import loads
+from tft_metrics import METRICS
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for the given retry attempt"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class SessionPool:
+    """Keeps one keep-alive requests.Session per API host so connections are reused"""
+    def __init__(self, pool_size: int = 10):
+        """
+        Args:
+            pool_size: Max pooled connections per host, should cover the number of workers
+        """
+        self.pool_size = pool_size
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+
+    def get(self, url: str) -> requests.Session:
+        """Returns the session for the host of url, creating it on first use"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+            return session
+
+
+    def close(self):
+        with self._lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+def _sleep_retry_after(delay: float, endpoint: str):
+    METRICS.inc('tft_rate_limit_sleep_seconds_total', delay, method=endpoint, window='retry-after')
+    time.sleep(delay)
+
+
+def request_json(sessions: SessionPool, url: str, api_key: str, max_retries: int = 5, timeout: float = 10.0,
+                 method: Optional[str] = None, before_attempt: Optional[Callable[[], None]] = None,
+                 after_response: Optional[Callable[[requests.Response], None]] = None,
+                 throttle: Optional[Callable[[float], None]] = None) -> Dict:
+    """
+    Bounded-retry GET of a Riot API url, returning the decoded JSON body
+
+    429s wait for Retry-After (or a backoff when missing), 5xx and connection errors
+    back off with jitter. Once retries run out the last error is raised, an error body
+    is never returned as data.
+
+    Args:
+        sessions: Pool the keep-alive session for the url's host is taken from
+        url: Full request url
+        api_key: Riot API key sent as X-Riot-Token
+        max_retries: Retries for 429, 5xx and connection errors before giving up
+        timeout: Seconds to wait on a single request
+        method: API method name the request metrics are labelled with (e.g. 'match')
+        before_attempt: Called before every attempt, e.g. to wait on a rate limiter
+        after_response: Called with every response, e.g. to sync rate limits from its headers
+        throttle: Called with the seconds a 429 asks to wait, sleeps when None
+
+    Raises:
+        requests.exceptions.HTTPError: A 4xx, or a 429/5xx still failing after the last retry
+    """
+    headers = {
+        "X-Riot-Token": api_key
+    }
+    session = sessions.get(url)
+    endpoint = method or 'other'
+    for attempt in range(max_retries + 1):
+        if before_attempt is not None:
+            before_attempt()
+        start = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            METRICS.inc('tft_api_requests_total', method=endpoint, status=type(e).__name__)
+            if attempt == max_retries:
+                print(f"Request failed: {e}")
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Request failed: {e}. Retrying in {delay:.2f}s...")
+            METRICS.inc('tft_api_retries_total', method=endpoint, reason='connection')
+            METRICS.inc('tft_api_backoff_seconds_total', delay, method=endpoint)
+            time.sleep(delay)
+            continue
+
+        METRICS.observe('tft_api_request_seconds', time.perf_counter() - start, method=endpoint)
+        METRICS.inc('tft_api_requests_total', method=endpoint, status=response.status_code)
+        if after_response is not None:
+            after_response(response)
+        if attempt == max_retries:
+            break
+
+        if response.status_code == 429:
+            retry_after = response.headers.get('Retry-After')
+            delay = int(retry_after) if retry_after else backoff_delay(attempt)
+            limit_type = response.headers.get('X-Rate-Limit-Type', 'service')
+            print(f"Rate limited by API ({limit_type}). Waiting {delay:.2f}s...")
+            METRICS.inc('tft_api_retries_total', method=endpoint, reason=f'429_{limit_type}')
+            if throttle is not None:
+                throttle(delay)
+            else:
+                _sleep_retry_after(delay, endpoint)
+            continue
+
+        if response.status_code >= 500:
+            delay = backoff_delay(attempt)
+            print(f"Server error {response.status_code}. Retrying in {delay:.2f}s...")
+            METRICS.inc('tft_api_retries_total', method=endpoint, reason='5xx')
+            METRICS.inc('tft_api_backoff_seconds_total', delay, method=endpoint)
+            time.sleep(delay)
+            continue
+        break
+
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError:
+        if response.status_code == 404:
+            print(f"Resource not found: {url}")
+        raise
+    with METRICS.timer('tft_api_decode_seconds', method=endpoint):
+        return loads(response.content)
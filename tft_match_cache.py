@@ -0,0 +1,126 @@
+import os
+import time
+import zlib
+import sqlite3
+import threading
+from typing import Dict, Optional
+from tft_codec import dumps_bytes, loads
+
+
+class MatchCache:
+    """
+    Persistent SQLite cache of raw match payloads keyed by match ID.
+
+    Finished matches never change, so a cached payload is always valid. Payloads
+    are stored zlib-compressed and the least recently used matches are evicted
+    once the cache grows past max_bytes. Several processes can share the file, so
+    the size is re-read from the table before evicting and every refresh_every puts.
+    """
+    def __init__(self, path: str = 'tft_data/match_cache.sqlite', max_bytes: int = 2 * 1024 ** 3,
+                 refresh_every: int = 100):
+        """
+        Initialize match cache
+
+        Args:
+            path: SQLite database file
+            max_bytes: Compressed payload size the cache is trimmed down to
+            refresh_every: Puts between re-reading the size other processes may have changed
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.refresh_every = refresh_every
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS matches ('
+            'match_id TEXT PRIMARY KEY, payload BLOB NOT NULL, '
+            'size INTEGER NOT NULL, last_access REAL NOT NULL)'
+        )
+        # covers the size sum and the eviction scan, which then never read the payload pages
+        self.conn.execute('CREATE INDEX IF NOT EXISTS matches_last_access_size ON matches (last_access, size)')
+        self.conn.execute('DROP INDEX IF EXISTS matches_last_access')
+        self.conn.commit()
+        self.total_bytes = self._table_bytes()
+
+
+    def _table_bytes(self) -> int:
+        return self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM matches INDEXED BY matches_last_access_size'
+        ).fetchone()[0]
+
+
+    def get(self, match_id: str) -> Optional[Dict]:
+        """Returns the cached match payload or None"""
+        with self._lock:
+            row = self.conn.execute('SELECT payload FROM matches WHERE match_id = ?', (match_id,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute('UPDATE matches SET last_access = ? WHERE match_id = ?', (time.time(), match_id))
+            self.conn.commit()
+        return loads(zlib.decompress(row[0]))
+
+
+    def put(self, match_id: str, match_data: Dict):
+        """Stores a match payload and evicts old entries if the cache is over size"""
+        payload = zlib.compress(dumps_bytes(match_data))
+        with self._lock:
+            old = self.conn.execute('SELECT size FROM matches WHERE match_id = ?', (match_id,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO matches (match_id, payload, size, last_access) VALUES (?, ?, ?, ?)',
+                (match_id, payload, len(payload), time.time())
+            )
+            self.total_bytes += len(payload) - (old[0] if old else 0)
+            self.puts += 1
+            if self.total_bytes > self.max_bytes or self.puts % self.refresh_every == 0:
+                self.total_bytes = self._table_bytes()
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+
+    def __contains__(self, match_id: str) -> bool:
+        with self._lock:
+            row = self.conn.execute('SELECT 1 FROM matches WHERE match_id = ?', (match_id,)).fetchone()
+        return row is not None
+
+
+    def _evict(self):
+        """Drops least recently used matches down to 90% of max_bytes, callers must hold the lock"""
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute('SELECT rowid, size FROM matches INDEXED BY matches_last_access_size '
+                                 'ORDER BY last_access')
+        evicted = []
+        for rowid, size in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((rowid,))
+            self.total_bytes -= size
+        rows.close()
+        self.conn.executemany('DELETE FROM matches WHERE rowid = ?', evicted)
+        self.evictions += len(evicted)
+
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'size_bytes': self.total_bytes
+        }
+
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
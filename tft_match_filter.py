@@ -0,0 +1,126 @@
+import re
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+SLOT_COLUMN = re.compile(r'^(unit|trait)_(\d+)_')
+
+class MatchFilter:
+    """
+    Composable filter for parsed match records
+
+    Set number, patch cutoff, queue ids and placement range are declared up front and
+    checked together in a single pass. apply_frame() masks a columnar frame that already
+    holds the columns the predicates read (self.columns), apply() builds those columns
+    from a list of records first and __call__ checks a single record (used while
+    streaming). Times are compared as epoch milliseconds.
+    """
+    def __init__(self, set_number: Optional[int] = None, released_after: Optional[datetime] = None,
+                 queue_ids: Optional[Iterable[int]] = None, placement_range: Optional[Tuple[int, int]] = None):
+        """
+        Args:
+            set_number: Keep only this TFT set, e.g. PatchRegistry().latest().set_number, None keeps every set
+            released_after: Keep only games played at or after this (local) time
+            queue_ids: Keep only these queues, e.g. 1100 for ranked
+            placement_range: Inclusive (best, worst) placement to keep, e.g. (1, 4) for top 4
+        """
+        self.predicates = []
+        self.columns = {}
+        if set_number is not None:
+            self.add(lambda record: record['tft_set_number'] == set_number,
+                     lambda df: df['tft_set_number'] == set_number,
+                     {'tft_set_number': lambda record: record['tft_set_number']})
+        if released_after is not None:
+            cutoff = int(released_after.timestamp() * 1000)
+            self.add(lambda record: game_timestamp(record) >= cutoff,
+                     lambda df: df['game_timestamp'] >= cutoff,
+                     {'game_timestamp': game_timestamp})
+        if queue_ids is not None:
+            queue_ids = set(queue_ids)
+            self.add(lambda record: record['queue_id'] in queue_ids,
+                     lambda df: df['queue_id'].isin(queue_ids),
+                     {'queue_id': lambda record: record['queue_id']})
+        if placement_range is not None:
+            best, worst = placement_range
+            self.add(lambda record: best <= record['placement'] <= worst,
+                     lambda df: df['placement'].between(best, worst),
+                     {'placement': lambda record: record['placement']})
+
+
+    def add(self, record_predicate: Callable[[Dict], bool], frame_predicate: Optional[Callable] = None,
+            columns: Optional[Dict[str, Callable[[Dict], object]]] = None):
+        """
+        Adds a predicate
+
+        Args:
+            record_predicate: Checks one parsed record
+            frame_predicate: Vectorized form over a dataframe, used by mask() and apply()
+            columns: Column name to record getter for every column frame_predicate reads
+        """
+        self.predicates.append((record_predicate, frame_predicate))
+        if frame_predicate is not None and columns is not None:
+            self.columns.update(columns)
+        else:
+            # apply() can only build the frame when it knows every column
+            self.columns = None
+        return self
+
+
+    def __call__(self, record: Dict) -> bool:
+        return all(record_predicate(record) for record_predicate, _ in self.predicates)
+
+
+    def apply(self, match_data: Iterable[Dict]) -> List[Dict]:
+        """Returns the records passing every predicate without copying them"""
+        records = match_data if isinstance(match_data, list) else list(match_data)
+        if not records or not self.predicates:
+            return records[:]
+        if self.columns is None:
+            return [record for record in records if self(record)]
+        df = pd.DataFrame({name: [getter(record) for record in records] for name, getter in self.columns.items()})
+        return [records[i] for i in np.flatnonzero(self.mask(df).to_numpy())]
+
+
+    def apply_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Rows of a columnar frame passing every predicate, as one vectorized mask
+
+        df can be a cleaner's wide dataframe prepared with the filter columns, or the
+        columns of a Parquet/Arrow file, it must hold every column in self.columns.
+        """
+        return df[self.mask(df)]
+
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        """Boolean mask of the dataframe rows passing every predicate"""
+        mask = pd.Series(True, index=df.index)
+        for _, frame_predicate in self.predicates:
+            if frame_predicate is None:
+                raise ValueError("MatchFilter.mask needs a frame predicate for every custom predicate")
+            mask &= frame_predicate(df)
+        return mask
+
+
+def game_timestamp(record: Dict) -> int:
+    """Epoch milliseconds of a parsed record, derived from game_datetime for older parsed files"""
+    timestamp = record.get('game_timestamp')
+    if timestamp is None:
+        timestamp = int(datetime.fromisoformat(record['game_datetime']).timestamp() * 1000)
+    return timestamp
+
+
+def drop_empty_slots(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drops the unit_i_* and trait_i_* columns of a wide dataframe whose unit or trait
+    slot no row fills, e.g. after masking away the only boards with a 10th unit
+    """
+    keep = []
+    for col in df.columns:
+        slot = SLOT_COLUMN.match(col)
+        if slot is not None:
+            anchor = f"{slot.group(1)}_{slot.group(2)}_{'character_id' if slot.group(1) == 'unit' else 'name'}"
+            if anchor in df.columns and not df[anchor].notna().any():
+                continue
+        keep.append(col)
+    return df[keep]
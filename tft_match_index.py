@@ -0,0 +1,99 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+SEEN = 'seen'
+FETCHED = 'fetched'
+PARSED = 'parsed'
+
+_ORDER = {SEEN: 0, FETCHED: 1, PARSED: 2}
+
+
+class MatchIndex:
+    """
+    Persistent index of every match ID collected by either pipeline.
+
+    Shared by the individuals and leagues collectors through tft_data/match_index.sqlite.
+    Each match moves from seen to fetched to parsed and never goes back. The index
+    only saves duplicate work: clients still fetch a match whose payload is no longer
+    in the match cache.
+    """
+    def __init__(self, path: str = 'tft_data/match_index.sqlite'):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS matches ('
+            'match_id TEXT PRIMARY KEY, status TEXT NOT NULL, '
+            'source TEXT, updated REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+
+    def statuses(self, match_ids: Iterable[str]) -> Dict[str, str]:
+        """Returns the status of every indexed match ID, unknown IDs are left out"""
+        match_ids = list(match_ids)
+        statuses = {}
+        with self._lock:
+            for i in range(0, len(match_ids), 500):
+                chunk = match_ids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.conn.execute(
+                    f'SELECT match_id, status FROM matches WHERE match_id IN ({placeholders})', chunk
+                )
+                statuses.update(rows)
+        return statuses
+
+
+    def status(self, match_id: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute('SELECT status FROM matches WHERE match_id = ?', (match_id,)).fetchone()
+        return row[0] if row else None
+
+
+    def is_fetched(self, match_id: str) -> bool:
+        return self.status(match_id) in (FETCHED, PARSED)
+
+
+    def filter_unfetched(self, match_ids: Iterable[str]) -> List[str]:
+        """Drops match IDs that were already fetched, keeping order"""
+        match_ids = list(match_ids)
+        statuses = self.statuses(match_ids)
+        return [match_id for match_id in match_ids if statuses.get(match_id) not in (FETCHED, PARSED)]
+
+
+    def mark(self, match_ids: Iterable[str], status: str, source: Optional[str] = None):
+        """Moves matches forward to status, a match never moves back to an earlier status"""
+        now = time.time()
+        rows = [(match_id, status, source, now) for match_id in match_ids]
+        with self._lock:
+            self.conn.executemany(
+                'INSERT INTO matches (match_id, status, source, updated) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(match_id) DO UPDATE SET status = excluded.status, updated = excluded.updated '
+                f'WHERE {self._rank_sql("excluded.status")} > {self._rank_sql("matches.status")}',
+                rows
+            )
+            self.conn.commit()
+
+
+    @staticmethod
+    def _rank_sql(column: str) -> str:
+        cases = ' '.join(f"WHEN '{status}' THEN {rank}" for status, rank in _ORDER.items())
+        return f'(CASE {column} {cases} END)'
+
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute('SELECT status, COUNT(*) FROM matches GROUP BY status')
+            return dict(rows)
+
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,282 @@
+import sys
+import json
+import time
+import bisect
+import pstats
+import cProfile
+import threading
+import contextlib
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def peak_memory_bytes() -> Optional[int]:
+    """Peak resident memory of this process so far, None where the platform does not report it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout, the last bucket is +Inf"""
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+    def cumulative(self) -> Iterator[Tuple[str, int]]:
+        """(le, observations <= le) per bucket"""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield ('+Inf' if bound == float('inf') else f'{bound:g}'), total
+
+
+class Stage:
+    """Handle of a running Metrics.stage, add the records the stage handled to records"""
+    def __init__(self, name: str):
+        self.name = name
+        self.records = 0
+
+
+class Metrics:
+    """
+    Process-wide counters, gauges and histograms, keyed by name and labels.
+
+    Every method is thread-safe so the API client's worker threads can record into
+    the shared METRICS instance. Export with prometheus() (text exposition format)
+    or snapshot() (JSON-ready dict, with a per-stage summary), or write either to a
+    file with write().
+    """
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, object]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        with self._lock:
+            self.counters[self._key(name, labels)] += value
+
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[self._key(name, labels)] = value
+
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        """Observes the seconds spent in the block into the name histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Times one pipeline stage, e.g. with METRICS.stage('parse') as stage: ... stage.records += n
+
+        Records seconds, records handled and the process's peak memory when the stage ended.
+        """
+        stage = Stage(name)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('tft_stage_seconds', elapsed, stage=name)
+            self.inc('tft_stage_records_total', stage.records, stage=name)
+            if elapsed > 0:
+                self.set('tft_stage_records_per_second', stage.records / elapsed, stage=name)
+            peak = peak_memory_bytes()
+            if peak is not None:
+                self.set('tft_stage_peak_memory_bytes', peak, stage=name)
+
+
+    def stages(self) -> Dict[str, Dict]:
+        """Seconds, records, records per second and peak memory of every stage run so far"""
+        with self._lock:
+            summary = {}
+            for (name, labels), histogram in self.histograms.items():
+                if name != 'tft_stage_seconds':
+                    continue
+                stage = dict(labels)['stage']
+                records = self.counters.get(('tft_stage_records_total', labels), 0)
+                summary[stage] = {
+                    'runs': histogram.count,
+                    'seconds': histogram.sum,
+                    'records': records,
+                    'records_per_second': records / histogram.sum if histogram.sum > 0 else None,
+                    'peak_memory_bytes': self.gauges.get(('tft_stage_peak_memory_bytes', labels)),
+                }
+            return summary
+
+
+    def _update_process_gauges(self):
+        peak = peak_memory_bytes()
+        if peak is not None:
+            self.set('tft_peak_memory_bytes', peak)
+        self.set('tft_uptime_seconds', time.time() - self.started)
+
+
+    def snapshot(self) -> Dict:
+        self._update_process_gauges()
+        with self._lock:
+            def rows(values):
+                return [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(values.items())]
+            histograms = [
+                {'name': name, 'labels': dict(labels), 'count': histogram.count, 'sum': histogram.sum,
+                 'buckets': dict(histogram.cumulative())}
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+            snapshot = {'created': datetime.now().isoformat(), 'counters': rows(self.counters),
+                        'gauges': rows(self.gauges), 'histograms': histograms}
+        snapshot['stages'] = self.stages()
+        return snapshot
+
+
+    @staticmethod
+    def _labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+    def prometheus(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        self._update_process_gauges()
+        lines = []
+        with self._lock:
+            for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+                typed = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in typed:
+                        lines.append(f'# TYPE {name} {kind}')
+                        typed.add(name)
+                    lines.append(f'{name}{self._labels(labels)} {float(value)!r}')
+            typed = set()
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} histogram')
+                    typed.add(name)
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{self._labels(labels, (("le", bound),))} {count}')
+                lines.append(f'{name}_sum{self._labels(labels)} {histogram.sum!r}')
+                lines.append(f'{name}_count{self._labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+    def write(self, path: str) -> str:
+        """Writes Prometheus text for .prom and .txt paths, JSON otherwise"""
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith(('.prom', '.txt')):
+                f.write(self.prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=2)
+        print(f"Saving Metrics to {path}")
+        return path
+
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+
+METRICS = Metrics()
+
+
+def add_profiling_arguments(parser):
+    """Adds the opt-in --metrics, --profile and --trace-memory flags to a CLI parser"""
+    group = parser.add_argument_group('profiling')
+    group.add_argument('--metrics', type=str, default=None,
+                       help='Write run metrics to this file, Prometheus text for .prom/.txt and JSON otherwise')
+    group.add_argument('--profile', type=str, default=None,
+                       help='Run under cProfile (main thread) and save the stats to this file')
+    group.add_argument('--trace-memory', action='store_true',
+                       help='Trace allocations with tracemalloc and print the top allocation sites')
+    return parser
+
+
+@contextlib.contextmanager
+def profiled(metrics_path: Optional[str] = None, profile_path: Optional[str] = None, trace_memory: bool = False,
+             top: int = 20):
+    """
+    Runs a CLI entry point with the profiling flags of add_profiling_arguments
+
+    Args:
+        metrics_path: Where METRICS is written when the block ends, see Metrics.write
+        profile_path: cProfile stats file, the top functions by cumulative time are printed too
+        trace_memory: Trace Python allocations and print the top allocation sites, slows the run down
+        top: Rows printed for the profile and the allocation sites
+    """
+    profiler = cProfile.Profile() if profile_path else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield METRICS
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            print(f"\n=== Profile (top {top} by cumulative time) ===")
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
+            print(f"Saving Profile to {profile_path}")
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            METRICS.set('tft_traced_memory_peak_bytes', peak)
+            print(f"\n=== Allocations (peak traced {peak / 1024 ** 2:.1f} MB) ===")
+            for stat in snapshot.statistics('lineno')[:top]:
+                print(stat)
+        if metrics_path:
+            for name, stage in METRICS.stages().items():
+                rate = f"{stage['records_per_second']:,.0f} records/s" if stage['records_per_second'] else ''
+                print(f"{name:<24} {stage['seconds']:8.2f}s {int(stage['records']):>10} records {rate}")
+            METRICS.write(metrics_path)
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import shutil
+import itertools
+import tempfile
+from typing import Dict, List, Optional, Tuple
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import GroupKFold
+
+DEFAULT_GRID = {
+    'n_estimators': [100],
+    'max_depth': [10, 20],
+    'min_samples_split': [5],
+    'min_samples_leaf': [2, 5],
+    'max_features': [1.0, 'sqrt'],
+}
+
+
+def expand_grid(param_grid: Dict[str, List]) -> List[Dict]:
+    """Every combination of a parameter grid, in a stable order"""
+    keys = sorted(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[key] for key in keys))]
+
+
+def match_folds(groups: np.ndarray, n_splits: int = 5) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """(train, test) row indices per fold, every board of a match lands in the same fold"""
+    return list(GroupKFold(n_splits=n_splits).split(np.zeros(len(groups)), groups=groups))
+
+
+def _fit_fold(X, y, train, test, params: Dict, random_state: int) -> Tuple[float, float, float]:
+    """Fits one configuration on one fold, runs in a worker on memory-mapped inputs"""
+    start = time.perf_counter()
+    model = RandomForestRegressor(random_state=random_state, n_jobs=1, **params)
+    model.fit(X[train], y[train])
+    fit_seconds = time.perf_counter() - start
+    mae = mean_absolute_error(y[test], model.predict(X[test]))
+    return mae, fit_seconds, time.perf_counter() - start - fit_seconds
+
+
+def grid_search(X, y, groups: Optional[np.ndarray], param_grid: Dict[str, List] = DEFAULT_GRID, n_splits: int = 5,
+                n_jobs: int = -1, random_state: int = 42, temp_folder: Optional[str] = None) -> List[Dict]:
+    """
+    Cross-validates every configuration of a random forest grid in parallel
+
+    Each (configuration, fold) pair is one job, and each job fits a single-threaded
+    forest so the cores are shared across jobs instead of inside one fit. The
+    feature matrix, placements and fold indices are dumped once to a memory-mapped
+    file that every worker opens read-only, so a worker only holds its own fold's
+    rows and one forest at a time.
+
+    Args:
+        X: Sparse feature matrix, see FeaturePipeline
+        y: Placements
+        groups: Match code per row, lobby mates never straddle a train/test split
+        param_grid: RandomForestRegressor parameters to try, every combination is run
+        n_splits: Folds per configuration
+        n_jobs: Worker processes, -1 uses every core
+        temp_folder: Where the memory-mapped inputs are written, defaults to the system temp folder
+
+    Returns:
+        One result per configuration, best mean absolute error first
+    """
+    if groups is None:
+        raise ValueError("grid_search needs the match_id of every row for match-grouped folds")
+    configs = expand_grid(param_grid)
+    folder = tempfile.mkdtemp(prefix='tft_tuning_', dir=temp_folder)
+    try:
+        path = os.path.join(folder, 'inputs.joblib')
+        joblib.dump((X.tocsr(), np.asarray(y, dtype=np.float64), match_folds(groups, n_splits)), path)
+        X, y, folds = joblib.load(path, mmap_mode='r')
+
+        print(f"\n=== Grid Search ({len(configs)} configurations x {len(folds)} match-grouped folds) ===")
+        start = time.time()
+        tasks = [(config, fold) for config in range(len(configs)) for fold in range(len(folds))]
+        scores = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_fold)(X, y, folds[fold][0], folds[fold][1], configs[config], random_state)
+            for config, fold in tasks
+        )
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    results = []
+    for config, params in enumerate(configs):
+        config_scores = [score for (task_config, _), score in zip(tasks, scores) if task_config == config]
+        fold_mae = [mae for mae, _, _ in config_scores]
+        results.append({
+            'params': params,
+            'mae_mean': float(np.mean(fold_mae)),
+            'mae_std': float(np.std(fold_mae)),
+            'fold_mae': fold_mae,
+            'fit_seconds': float(sum(fit for _, fit, _ in config_scores)),
+            'predict_seconds': float(sum(predict for _, _, predict in config_scores)),
+        })
+    results.sort(key=lambda result: result['mae_mean'])
+
+    for result in results:
+        print(f"MAE {result['mae_mean']:.3f} (+/- {result['mae_std']:.3f})  "
+              f"fit {result['fit_seconds']:.1f}s  predict {result['predict_seconds']:.1f}s  {result['params']}")
+    print(f"Grid search finished in {time.time() - start:.1f}s")
+    return results
+
+
+def save_report(results: List[Dict], path: str = 'tft_data/models/tuning_report.json') -> str:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saving Tuning Report to {path}")
+    return path
@@ -0,0 +1,96 @@
+import os
+import re
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from tft_match_filter import game_timestamp
+
+PATCH_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tft_patches.json')
+
+_RELEASE_PATTERN = re.compile(r'<Releases/(\d+\.\d+)>')
+_VERSION_PATTERN = re.compile(r'Version (\d+)\.(\d+)')
+
+
+class Patch(NamedTuple):
+    name: str
+    set_number: int
+    version: str
+    released: datetime
+
+    @property
+    def released_ms(self) -> int:
+        return int(self.released.timestamp() * 1000)
+
+
+class PatchRegistry:
+    """
+    Maps match game_version strings and times to TFT patches.
+
+    Patches are read from tft_patches.json, each with its set number, the major.minor
+    version reported in game_version and its release time (local time, like
+    game_datetime). Hotfixes share a version, so the release time decides between them.
+    """
+    def __init__(self, path: str = PATCH_FILE):
+        with open(path, 'r') as f:
+            entries = json.load(f)['patches']
+        self.patches = sorted(
+            (Patch(entry['name'], entry['set_number'], entry['version'], datetime.fromisoformat(entry['released']))
+             for entry in entries),
+            key=lambda patch: patch.released
+        )
+        self.by_name = {patch.name: patch for patch in self.patches}
+        self._versions = {}
+
+
+    def get(self, name: str) -> Patch:
+        if name not in self.by_name:
+            raise ValueError(f"Unknown patch {name}, add it to {PATCH_FILE}")
+        return self.by_name[name]
+
+
+    def latest(self, set_number: Optional[int] = None) -> Patch:
+        """Most recently released patch, optionally within one set"""
+        patches = [patch for patch in self.patches if set_number is None or patch.set_number == set_number]
+        if not patches:
+            raise ValueError(f"No patches registered for set {set_number}")
+        return patches[-1]
+
+
+    def version_of(self, game_version: str) -> Optional[str]:
+        """Extracts the major.minor version, e.g. '16.1', from a game_version string"""
+        version = self._versions.get(game_version)
+        if version is None and game_version not in self._versions:
+            match = _RELEASE_PATTERN.search(game_version)
+            if match:
+                version = match.group(1)
+            else:
+                match = _VERSION_PATTERN.search(game_version)
+                version = f'{match.group(1)}.{match.group(2)}' if match else None
+            self._versions[game_version] = version
+        return version
+
+
+    def patch_for(self, game_version: str, timestamp_ms: int) -> str:
+        """
+        Name of the patch a game was played on
+
+        Falls back to the bare version when no registered patch of that version was
+        released before the game, and to 'unknown' when the version can't be read.
+        """
+        version = self.version_of(game_version)
+        if version is None:
+            return 'unknown'
+        name = version
+        for patch in self.patches:
+            if patch.version == version and patch.released_ms <= timestamp_ms:
+                name = patch.name
+        return name
+
+
+    def partition(self, match_data: Iterable[Dict]) -> Dict[str, List[Dict]]:
+        """Splits parsed records by patch name in a single pass"""
+        partitions = {}
+        for record in match_data:
+            name = self.patch_for(record['game_version'], game_timestamp(record))
+            partitions.setdefault(name, []).append(record)
+        return partitions
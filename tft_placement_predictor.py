@@ -1,11 +1,16 @@
 from PIL.Image import item
 import pandas as pd
 import numpy as np  
-from sklearn.model_selection import train_test_split, cross_val_score
+import argparse
+from sklearn.model_selection import train_test_split, cross_val_score, GroupShuffleSplit
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import matplotlib.pyplot as plt
 import seaborn as sns
+from tft_features import FeaturePipeline
+from tft_placement_scoring import MODEL_PATH, save_model
+from tft_model_tuning import DEFAULT_GRID, grid_search, save_report
+from tft_metrics import METRICS, add_profiling_arguments, profiled
 
 np.random.seed(42)
 
@@ -13,6 +18,8 @@ def load_csv(csv):
     df = pd.read_csv(csv, index_col = 0)
     return df 
 
+VOCABULARY_PATH = 'tft_data/models/board_vocabulary.json'
+
 def prep_features(df):
     y = df['placement']
     item_cols = ['unit_5_item_3', 'unit_5_item_1',	
@@ -67,7 +74,7 @@ def train_rf_model(X_train, y_train, X_test, y_test):
     )
 
     print("\n=== Training Random Forest ===")
-    print(f"Training on {len(X_train)} samples...")
+    print(f"Training on {X_train.shape[0]} samples...")
 
     rf_model.fit(X_train, y_train)
     y_train_pred = rf_model.predict(X_train)
@@ -83,16 +90,26 @@ def train_rf_model(X_train, y_train, X_test, y_test):
 
     return rf_model, y_test_pred
 
-def cross_validate_model(X, y):
+def cross_validate_model(X, y, groups=None, n_jobs=-1):
+    """5-fold CV, folds are grouped by match and run in parallel when groups is given"""
+    params = {
+        'n_estimators': 100,
+        'max_depth': 10,
+        'min_samples_split': 5,
+    }
+    print("\n=== Cross-Validation (5-fold) ===")
+    if groups is not None:
+        results = grid_search(X, y, groups, {key: [value] for key, value in params.items()}, n_splits=5, n_jobs=n_jobs)
+        cv_mae = np.array(results[0]['fold_mae'])
+        print(f"CV MAE scores: {cv_mae}")
+        print(f"Mean CV MAE: {cv_mae.mean():.3f} (+/- {cv_mae.std():.3f})")
+        return cv_mae
+
     rf_model = RandomForestRegressor(
-        n_estimators=100,
-        max_depth=10,
-        min_samples_split=5,
         random_state=42,
-        n_jobs=-1
+        n_jobs=-1,
+        **params
     )
-    
-    print("\n=== Cross-Validation (5-fold) ===")
 
     cv_scores = cross_val_score(
         rf_model, X, y, 
@@ -175,20 +192,55 @@ def plot_placement_distribution(y_true, y_pred):
     print(f"\nPlacement distribution plot saved to 'placement_distribution.png'")
 
 
-def main():
-    filepath = '/Users/christiangrier/Documents/tft_game_research/tft_data/cleaned_csv/NA1_5439283217_NA1_5439506130_2001.csv'
-    csv = load_csv(filepath)
-    X, y = prep_features(csv)
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
-    print(f"\nTrain set size: {len(X_train)}")
-    print(f"Test set size: {len(X_test)}")
-    model, y_pred = train_rf_model(X_train, y_train, X_test, y_test)
-    cv_scores = cross_validate_model(X, y)
-    importances = analyze_feature_importance(model, X.columns.tolist())
+def main(filepath='/Users/christiangrier/Documents/tft_game_research/tft_data/cleaned_csv/NA1_5439283217_NA1_5439506130_2001.csv',
+         tune=False, folds=5, jobs=-1):
+    pipeline = FeaturePipeline()
+    with METRICS.stage('features') as stage:
+        X, y = pipeline.fit_transform(filepath)
+        stage.records = X.shape[0]
+    groups = pipeline.groups
+    vectorizer = pipeline.vectorizer
+    vectorizer.save(VOCABULARY_PATH)
+    if tune:
+        with METRICS.stage('grid_search') as stage:
+            results = grid_search(X, y, groups, DEFAULT_GRID, n_splits=folds, n_jobs=jobs)
+            stage.records = X.shape[0]
+        save_report(results)
+        return
+    if groups is not None:
+        # keep every board of a lobby on the same side of the split
+        train, test = next(GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42).split(X, y, groups))
+        X_train, X_test, y_train, y_test = X[train], X[test], y.iloc[train], y.iloc[test]
+    else:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+    print(f"\nTrain set size: {X_train.shape[0]}")
+    print(f"Test set size: {X_test.shape[0]}")
+    with METRICS.stage('train') as stage:
+        model, y_pred = train_rf_model(X_train, y_train, X_test, y_test)
+        stage.records = X_train.shape[0]
+    save_model(model, vectorizer, MODEL_PATH, trained_on=filepath)
+    with METRICS.stage('cross_validate') as stage:
+        cv_scores = cross_validate_model(X, y, groups, n_jobs=jobs)
+        stage.records = X.shape[0]
+    importances = analyze_feature_importance(model, vectorizer.feature_names)
     plot_predictions(y_test, y_pred)
     plot_placement_distribution(y_test, y_pred)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='TFT Placement Predictor')
+    parser.add_argument('--data', type=str, default=None,
+                        help='Cleaned dataset file (csv, parquet or arrow)')
+    parser.add_argument('--tune', action='store_true',
+                        help='Run the parallel grid search instead of training, writes tft_data/models/tuning_report.json')
+    parser.add_argument('--folds', type=int, default=5,
+                        help='Match-grouped CV folds for --tune (default: 5)')
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help='Worker processes for CV and --tune (default: -1, every core)')
+    add_profiling_arguments(parser)
+
+    args = parser.parse_args()
+    kwargs = {'filepath': args.data} if args.data else {}
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        main(tune=args.tune, folds=args.folds, jobs=args.jobs, **kwargs)
\ No newline at end of file
@@ -0,0 +1,135 @@
+import os
+import time
+import argparse
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+import joblib
+import numpy as np
+from tft_features import BoardVectorizer, FeaturePipeline, record_tokens
+from tft_metrics import METRICS, add_profiling_arguments, profiled
+
+MODEL_PATH = 'tft_data/models/placement_model.joblib'
+
+
+def save_model(model, vectorizer: BoardVectorizer, path: str = MODEL_PATH, trained_on: Optional[str] = None) -> str:
+    """
+    Saves a fitted placement model together with the vocabulary it was trained on
+
+    Returns:
+        Path of the model artifact
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    artifact = {
+        'model': model,
+        'features': vectorizer.feature_names,
+        'kinds': list(vectorizer.kinds),
+        'min_count': vectorizer.min_count,
+        'trained_on': trained_on,
+        'created': datetime.now().isoformat(),
+    }
+    joblib.dump(artifact, path)
+    print(f"Saving Placement Model to {path}")
+    return path
+
+
+class PlacementScorer:
+    """
+    Predicts placements for boards with a saved placement model.
+
+    Batches of parse_data records or whole cleaned dataset files go through the
+    model's own predict. Single boards take a fast path that walks the forest's
+    trees directly over the board's handful of non-zero features, avoiding the
+    per-call input validation and thread dispatch of predict.
+    """
+    def __init__(self, model, vectorizer: BoardVectorizer, batch_size: int = 50000):
+        """
+        Args:
+            model: Fitted tree ensemble regressor, e.g. RandomForestRegressor
+            vectorizer: Vectorizer with the vocabulary the model was trained on
+            batch_size: Boards scored per predict call, bounds memory for large batches
+        """
+        self.model = model
+        self.vectorizer = vectorizer
+        self.batch_size = batch_size
+        self.trees = [self._flatten(estimator.tree_) for estimator in model.estimators_]
+
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH, **kwargs):
+        artifact = joblib.load(path)
+        vocabulary = {token: i for i, token in enumerate(artifact['features'])}
+        vectorizer = BoardVectorizer(min_count=artifact['min_count'], kinds=artifact['kinds'], vocabulary=vocabulary)
+        return cls(artifact['model'], vectorizer, **kwargs)
+
+
+    @staticmethod
+    def _flatten(tree):
+        """Node arrays of one fitted tree as plain lists, which index faster than numpy from Python"""
+        return (tree.children_left.tolist(), tree.children_right.tolist(), tree.feature.tolist(),
+                tree.threshold.tolist(), tree.value[:, 0, 0].tolist())
+
+
+    def score(self, records: Iterable[Dict]) -> np.ndarray:
+        """Predicted placement of each parsed participant record, in order"""
+        records = list(records)
+        predictions = [
+            self.model.predict(self.vectorizer.transform_records(records[i:i + self.batch_size]))
+            for i in range(0, len(records), self.batch_size)
+        ]
+        return np.concatenate(predictions) if predictions else np.empty(0)
+
+
+    def score_file(self, path: str, cache_dir: str = 'tft_data/feature_cache') -> np.ndarray:
+        """Predicted placement of every board in a cleaned dataset file, features are cached per file"""
+        X, _ = FeaturePipeline(cache_dir=cache_dir, vectorizer=self.vectorizer).transform(path)
+        predictions = [self.model.predict(X[i:i + self.batch_size]) for i in range(0, X.shape[0], self.batch_size)]
+        return np.concatenate(predictions) if predictions else np.empty(0)
+
+
+    def score_board(self, record: Dict) -> float:
+        """Predicted placement of a single parsed board, the low latency path for live lobbies"""
+        vocabulary = self.vectorizer.vocabulary
+        x = {}
+        for token in record_tokens(record, self.vectorizer.kinds):
+            column = vocabulary.get(token)
+            if column is not None:
+                x[column] = x.get(column, 0.0) + 1.0
+
+        total = 0.0
+        for left, right, feature, threshold, value in self.trees:
+            node = 0
+            while left[node] != -1:
+                node = left[node] if x.get(feature[node], 0.0) <= threshold[node] else right[node]
+            total += value[node]
+        return total / len(self.trees)
+
+
+    def score_lobby(self, records: List[Dict]) -> List[float]:
+        """Predicted placement of each board of a lobby through the single-board path"""
+        return [self.score_board(record) for record in records]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TFT Placement Scoring')
+    parser.add_argument('path', type=str,
+                        help='Cleaned dataset file (csv, parquet or arrow) to score')
+    parser.add_argument('--model', type=str, default=MODEL_PATH,
+                        help=f'Model artifact (default: {MODEL_PATH})')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write the predictions to this csv (default: print a summary)')
+    add_profiling_arguments(parser)
+
+    args = parser.parse_args()
+    with profiled(args.metrics, args.profile, args.trace_memory):
+        scorer = PlacementScorer.load(args.model)
+        start = time.time()
+        with METRICS.stage('score') as stage:
+            predictions = scorer.score_file(args.path)
+            stage.records = len(predictions)
+        print(f"Scored {len(predictions)} boards in {time.time() - start:.2f}s")
+        if args.output:
+            np.savetxt(args.output, predictions, fmt='%.4f', header='predicted_placement', comments='')
+            print(f"Saving Predictions to {args.output}")
+        elif len(predictions):
+            print(f"Mean predicted placement: {predictions.mean():.3f}")